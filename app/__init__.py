@@ -1,27 +1,103 @@
+import json
 import os
-from flask import Flask
+from flask import Flask, Request, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from markupsafe import Markup, escape
 from dotenv import load_dotenv
+from .database import database_uri, engine_options, configure_sqlite
 
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
+# Views whose request body may be up to BULK_MAX_CONTENT_LENGTH instead of MAX_CONTENT_LENGTH
+LARGE_UPLOAD_ENDPOINTS = {'admin.bulk_upload'}
+
+class UploadLimitRequest(Request):
+    """Request whose body size limit is raised for the bulk upload view."""
+
+    @property
+    def max_content_length(self):
+        if current_app and self.endpoint in LARGE_UPLOAD_ENDPOINTS:
+            return current_app.config['BULK_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
 def create_app():
     """Create and configure the Flask application."""
     app = Flask(__name__)
+    app.request_class = UploadLimitRequest
     
     # Load environment variables
     load_dotenv()
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-for-testing')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///resume_screener.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))  # connections kept per process (server databases)
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))  # extra connections under load
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    app.config['SQLITE_BUSY_TIMEOUT'] = float(os.getenv('SQLITE_BUSY_TIMEOUT', 30))  # seconds a writer waits for the lock
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB max request size
+    app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024  # bytes copied per read when saving uploads
+    app.config['API_STREAM_BATCH_SIZE'] = int(os.getenv('API_STREAM_BATCH_SIZE', 1000))  # rows fetched per query when streaming NDJSON
+    
+    # Bulk upload
+    app.config['BULK_MAX_CONTENT_LENGTH'] = int(os.getenv('BULK_MAX_CONTENT_LENGTH', 2 * 1024 * 1024 * 1024))  # 2GB max bulk upload request, spooled to disk
+    app.config['BULK_MAX_ENTRY_SIZE'] = int(os.getenv('BULK_MAX_ENTRY_SIZE', 16 * 1024 * 1024))  # per file inside a ZIP
+    app.config['BULK_COMMIT_SIZE'] = int(os.getenv('BULK_COMMIT_SIZE', 100))  # resumes saved per commit
+    
+    # Background worker pool (0 processes runs tasks inside the request)
+    app.config['WORKER_CONCURRENCY'] = int(os.getenv('WORKER_CONCURRENCY', os.cpu_count() or 1))
+    app.config['WORKER_AUTOSTART'] = os.getenv('WORKER_AUTOSTART', 'true').lower() == 'true'
+    app.config['WORKER_POLL_INTERVAL'] = float(os.getenv('WORKER_POLL_INTERVAL', 2))
+    app.config['WORKER_STALE_AFTER'] = int(os.getenv('WORKER_STALE_AFTER', 600))  # seconds without a heartbeat before a running task is requeued
+    app.config['WORKER_MAX_ATTEMPTS'] = int(os.getenv('WORKER_MAX_ATTEMPTS', 3))
+    app.config['SCHEDULE_RETRY_INTERVAL'] = int(os.getenv('SCHEDULE_RETRY_INTERVAL', 300))  # seconds before a skipped scheduled task is tried again
+    app.config['WORKER_BATCH_SIZE'] = int(os.getenv('WORKER_BATCH_SIZE', 16))  # resumes per bulk task
+    app.config['RESCORE_BATCH_SIZE'] = int(os.getenv('RESCORE_BATCH_SIZE', 500))  # resumes rescored per commit after a job edit
+    
+    # Skill taxonomy: one skill per line, synonyms separated by '|'
+    app.config['SKILL_TAXONOMY_PATH'] = os.getenv('SKILL_TAXONOMY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'skills.txt'))
+    
+    # spaCy nlp.pipe settings for batch extraction
+    app.config['NLP_BATCH_SIZE'] = int(os.getenv('NLP_BATCH_SIZE', 32))
+    app.config['NLP_N_PROCESS'] = int(os.getenv('NLP_N_PROCESS', 1))
+    
+    # PDF extraction limits
+    app.config['PDF_MAX_PAGES'] = int(os.getenv('PDF_MAX_PAGES', 50))
+    app.config['PDF_MAX_CHARS'] = int(os.getenv('PDF_MAX_CHARS', 200000))
+    app.config['PDF_TIME_BUDGET'] = float(os.getenv('PDF_TIME_BUDGET', 30))  # seconds per document
+    app.config['PDF_PARALLEL_MIN_PAGES'] = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 20))  # split longer PDFs across processes
+    app.config['PDF_PARALLEL_WORKERS'] = int(os.getenv('PDF_PARALLEL_WORKERS', min(4, os.cpu_count() or 1)))
+    
+    # Corpus-wide TF-IDF model used for scoring
+    app.config['TFIDF_MODEL_PATH'] = os.getenv('TFIDF_MODEL_PATH', os.path.join(app.instance_path, 'tfidf_model.joblib'))
+    app.config['TFIDF_MAX_FEATURES'] = int(os.getenv('TFIDF_MAX_FEATURES', 50000))  # 0 keeps every term
+    app.config['TFIDF_REFIT_INTERVAL'] = int(os.getenv('TFIDF_REFIT_INTERVAL', 24 * 3600))  # seconds, 0 disables scheduled refits
+    
+    # Job keywords and vectors kept per process, least recently used first out
+    app.config['JOB_CACHE_SIZE'] = int(os.getenv('JOB_CACHE_SIZE', 256))
+    
+    # Seconds the admin dashboard counts are reused between writes (0 disables)
+    app.config['STATS_CACHE_TTL'] = float(os.getenv('STATS_CACHE_TTL', 10))
+    app.config['JOB_STATS_REFRESH_INTERVAL'] = int(os.getenv('JOB_STATS_REFRESH_INTERVAL', 3600))  # seconds between full job_stats recomputations, 0 disables them
+    
+    # Estimated Jaccard similarity of word shingles above which resumes are near duplicates
+    app.config['NEAR_DUPLICATE_THRESHOLD'] = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.8))
+    
+    # Memory-mapped store of resume TF-IDF vectors used for ranking
+    app.config['VECTOR_STORE_FOLDER'] = os.getenv('VECTOR_STORE_FOLDER', os.path.join(app.instance_path, 'vectors'))
+    app.config['VECTOR_COMPACT_INTERVAL'] = int(os.getenv('VECTOR_COMPACT_INTERVAL', 3600))  # seconds, 0 disables compaction
+    app.config['VECTOR_SYNC_INTERVAL'] = int(os.getenv('VECTOR_SYNC_INTERVAL', 3600))  # seconds between full store/database reconciliations, 0 disables them
+    app.config['VECTOR_COMPACT_MIN_DEAD'] = float(os.getenv('VECTOR_COMPACT_MIN_DEAD', 0.2))  # share of deleted/replaced vectors before compacting
+    
+    # Compressed copies of the text extracted from each resume file
+    app.config['TEXT_STORE_FOLDER'] = os.getenv('TEXT_STORE_FOLDER', os.path.join(app.instance_path, 'text_store'))
     
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -30,6 +106,13 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
     
+    # Template helpers
+    from flask_wtf.csrf import generate_csrf
+    app.jinja_env.globals['csrf_token'] = generate_csrf
+    # Packed resume columns arrive decoded; plain JSON strings are parsed
+    app.jinja_env.filters['from_json'] = lambda value: (json.loads(value) if isinstance(value, str) else value) or []
+    app.jinja_env.filters['nl2br'] = lambda value: Markup('<br>\n').join(escape(value or '').splitlines())
+    
     # Register blueprints
     from .routes import main as main_blueprint
     from .auth import auth as auth_blueprint
@@ -39,8 +122,29 @@ def create_app():
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
     app.register_blueprint(admin_blueprint, url_prefix='/admin')
     
-    # Create database tables
+    # Register CLI commands
+    from .tasks import worker_command, reprocess_command
+    from .scoring import refit_model_command
+    from .minhash import backfill_minhash_command
+    from .migrations import backfill_skills_command, pack_resume_data_command
+    from .search import rebuild_search_index_command
+    from .jobstats import refresh_job_stats_command
+    app.cli.add_command(worker_command)
+    app.cli.add_command(reprocess_command)
+    app.cli.add_command(refit_model_command)
+    app.cli.add_command(backfill_minhash_command)
+    app.cli.add_command(backfill_skills_command)
+    app.cli.add_command(pack_resume_data_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(refresh_job_stats_command)
+    
+    # Create database tables and add columns introduced since they were created
+    from .migrations import upgrade_schema
+    from .search import create_search_index
     with app.app_context():
+        configure_sqlite(db.engine, app.config['SQLITE_BUSY_TIMEOUT'])
         db.create_all()
+        upgrade_schema(db)
+        create_search_index(db)
     
     return app
@@ -1,10 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_from_directory, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from . import db
-from .models import Resume, Job, User
+from .models import Resume, Job, User, Task, resume_list_query
 from .forms import JobForm
+from .ranking import rank_resumes, invalidate_job_matrix
+from .skills import filter_by_skills
+from .search import search_resumes, remove_from_index
+from .minhash import remove_from_lsh_index
+from .stats import resume_stats
+from .jobstats import get_job_stats
+from .tasks import enqueue, enqueue_unique, enqueue_resumes
+from .textstore import get_text_store, text_key
+from .vectorstore import get_vector_store
+from .utils import iter_uploaded_resumes, save_resume_file, export_resumes_to_excel, iter_resumes_csv
 import os
+import tempfile
+from datetime import datetime, timedelta
 
 admin = Blueprint('admin', __name__)
 
@@ -16,22 +28,31 @@ def require_admin():
         flash('You do not have permission to access this page.', 'error')
         return redirect(url_for('main.index'))
 
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, ignoring anything else."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
 @admin.route('/')
 @login_required
 def dashboard():
     """Admin dashboard with statistics."""
-    stats = {
-        'total_resumes': Resume.query.count(),
-        'total_jobs': Job.query.count(),
-        'total_users': User.query.count(),
-        'pending_resumes': Resume.query.filter_by(status='pending').count(),
-    }
+    stats = resume_stats()
     
-    recent_resumes = Resume.query.order_by(Resume.upload_date.desc()).limit(5).all()
+    recent_resumes = resume_list_query().options(db.defer(Resume.skills)) \
+        .order_by(Resume.upload_date.desc()).limit(5).all()
     recent_jobs = Job.query.order_by(Job.created_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
-                         stats=stats, 
+                         resume_count=stats['resumes'],
+                         job_count=stats['jobs'],
+                         user_count=stats['users'],
+                         pending_reviews=stats['status'].get('pending', 0) + stats['status'].get('processing', 0),
+                         completed_resumes=stats['status'].get('processed', 0),
+                         applications_this_month=stats['this_month'],
+                         new_users_this_month=0,  # users have no sign-up date
                          recent_resumes=recent_resumes,
                          recent_jobs=recent_jobs)
 
@@ -40,18 +61,157 @@ def dashboard():
 def manage_resumes():
     """View and manage all resumes."""
     page = request.args.get('page', 1, type=int)
-    status = request.args.get('status', 'all')
+    status = request.args.get('status') or 'all'
+    cluster = request.args.get('cluster', type=int)
+    job_id = request.args.get('job_id', type=int)
+    skills = [skill for skill in request.args.get('skills', '').split(',') if skill.strip()]
+    q = request.args.get('q', '').strip()
+    date_from = parse_date(request.args.get('date_from'))
+    date_to = parse_date(request.args.get('date_to'))
     
-    query = Resume.query
+    query = resume_list_query()
     
     if status != 'all':
         query = query.filter_by(status=status)
+    if job_id:
+        query = query.filter_by(job_id=job_id)
+    if date_from:
+        query = query.filter(Resume.upload_date >= date_from)
+    if date_to:
+        # The end date is inclusive
+        query = query.filter(Resume.upload_date < date_to + timedelta(days=1))
+    if skills:
+        query = filter_by_skills(query, skills)
+    if q:
+        # Ranked by relevance first, newest first among equal matches
+        query = search_resumes(query, q)
+    if cluster:
+        # A near-duplicate cluster: its first resume and everything linked to it
+        query = query.filter(db.or_(Resume.id == cluster, Resume.near_duplicate_of_id == cluster))
+    
+    pagination = query.order_by(Resume.upload_date.desc()).paginate(page=page, per_page=20)
+    
+    counts = resume_stats()
+    stats = {
+        'processed': counts['status'].get('processed', 0),
+        'pending': counts['status'].get('pending', 0) + counts['status'].get('processing', 0),
+        'error': counts['status'].get('error', 0),
+        'duplicates': counts['duplicates'],
+        'near_duplicates': counts['near_duplicates'],
+    }
+    
+    return render_template('admin/manage_resumes.html', 
+                         resumes=pagination.items,
+                         pagination=pagination,
+                         stats=stats,
+                         all_jobs=Job.query.order_by(Job.title).all(),
+                         current_status=status,
+                         current_cluster=cluster)
+
+@admin.route('/resumes/bulk-upload', methods=['POST'])
+@login_required
+def bulk_upload():
+    """Upload many resumes at once from PDF/DOCX files and ZIP archives."""
+    job_id = request.form.get('job_id', type=int)
+    if job_id and not db.session.get(Job, job_id):
+        job_id = None
+    overwrite = bool(request.form.get('overwrite_existing'))
+    commit_size = current_app.config['BULK_COMMIT_SIZE']
+    
+    results = []
+    batch = []
+    
+    def queue_batch():
+        # Commit the saved resumes and fan them out to the worker pool
+        if batch:
+            db.session.commit()
+            enqueue_resumes([resume.id for _, resume in batch])
+            results.extend({'file': name, 'status': 'queued', 'resume_id': resume.id} for name, resume in batch)
+            batch.clear()
     
-    resumes = query.order_by(Resume.upload_date.desc()).paginate(page=page, per_page=20)
+    for name, stream, error in iter_uploaded_resumes(request.files.getlist('files')):
+        if error:
+            results.append({'file': name, 'status': 'error', 'message': error})
+            continue
+        
+        try:
+            filename = secure_filename(name)
+            unique_filename, filepath, file_hash = save_resume_file(stream, filename)
+        except Exception as e:
+            current_app.logger.error(f"Error saving bulk upload file {name}: {str(e)}")
+            results.append({'file': name, 'status': 'error', 'message': 'Could not read file'})
+            continue
+        
+        resume = None
+        if overwrite:
+            resume = Resume.query.filter_by(original_filename=filename, job_id=job_id).first()
+        
+        if resume:
+            # Replace the stored file and run the resume through processing again
+            if os.path.exists(resume.file_path):
+                os.remove(resume.file_path)
+            resume.filename = unique_filename
+            resume.file_path = filepath
+            resume.file_hash = file_hash
+            resume.duplicate_of_id = None
+            resume.near_duplicate_of_id = None
+            resume.minhash = None
+            remove_from_lsh_index(resume.id)
+            resume.status = 'pending'
+        else:
+            resume = Resume(
+                filename=unique_filename,
+                file_path=filepath,
+                original_filename=filename,
+                file_hash=file_hash,
+                status='pending',
+                user_id=current_user.id,
+                job_id=job_id
+            )
+            db.session.add(resume)
+        
+        db.session.flush()
+        batch.append((name, resume))
+        if len(batch) >= commit_size:
+            queue_batch()
+    
+    queue_batch()
+    
+    queued = sum(1 for result in results if result['status'] == 'queued')
+    failed = len(results) - queued
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'queued': queued, 'failed': failed, 'results': results})
     
-    return render_template('admin/resumes.html', 
-                         resumes=resumes,
-                         current_status=status)
+    if queued:
+        flash(f'{queued} resume(s) uploaded and queued for processing.', 'success')
+    if failed:
+        flash(f'{failed} file(s) could not be uploaded.', 'error')
+    return redirect(url_for('admin.manage_resumes'))
+
+@admin.route('/resumes/status')
+@login_required
+def resume_status():
+    """Return the processing status of the given resume ids."""
+    ids = [int(i) for i in request.args.get('ids', '').split(',') if i.isdigit()]
+    rows = db.session.query(Resume.id, Resume.status, Resume.score).filter(Resume.id.in_(ids)).all() if ids else []
+    
+    return jsonify({str(row.id): {'status': row.status, 'score': row.score} for row in rows})
+
+@admin.route('/tasks/<int:task_id>')
+@login_required
+def task_status(task_id):
+    """Return the status and progress of a background task."""
+    task = Task.query.get_or_404(task_id)
+    
+    return jsonify({
+        'id': task.id,
+        'kind': task.kind,
+        'status': task.status,
+        'progress': task.progress or 0,
+        'total': task.total,
+        'error': task.error
+    })
 
 @admin.route('/resume/<int:resume_id>/delete', methods=['POST'])
 @login_required
@@ -66,13 +226,48 @@ def delete_resume(resume_id):
     except Exception as e:
         flash(f'Error deleting file: {str(e)}', 'error')
     
+    # Delete the stored text unless another resume has the same file content
+    key = text_key(resume)
+    if not resume.file_hash or Resume.query.filter(Resume.file_hash == resume.file_hash, Resume.id != resume.id).count() == 0:
+        get_text_store().delete(key)
+    
+    # The oldest remaining copy becomes the original of the other duplicates,
+    # and the oldest remaining member the root of its near-duplicate cluster
+    promoted = False
+    for column in (Resume.duplicate_of_id, Resume.near_duplicate_of_id):
+        duplicate_ids = [row.id for row in db.session.query(Resume.id).filter(column == resume.id).order_by(Resume.id)]
+        if duplicate_ids:
+            Resume.query.filter(Resume.id.in_(duplicate_ids)).update({column: duplicate_ids[0]}, synchronize_session=False)
+            Resume.query.filter_by(id=duplicate_ids[0]).update({column: None}, synchronize_session=False)
+            promoted = promoted or column is Resume.duplicate_of_id
+    
     # Delete the database record
+    remove_from_index(resume.id)
+    remove_from_lsh_index(resume.id)
     db.session.delete(resume)
     db.session.commit()
+    get_vector_store().delete([resume_id])
+    if promoted:
+        # The new original of the exact duplicates gets the vector they share
+        enqueue_unique('sync_vectors')
     
     flash('Resume deleted successfully!', 'success')
     return redirect(url_for('admin.manage_resumes'))
 
+@admin.route('/resume/<int:resume_id>/reprocess', methods=['POST'])
+@login_required
+def reprocess_resume(resume_id):
+    """Queue a resume for processing again, reusing its stored text unless forced."""
+    resume = Resume.query.get_or_404(resume_id)
+    force = request.form.get('force', 'false').lower() == 'true'
+    
+    resume.status = 'pending'
+    db.session.commit()
+    enqueue('process_resume', resume_id=resume.id, force=force)
+    
+    flash('Resume queued for reprocessing.', 'success')
+    return redirect(url_for('admin.manage_resumes'))
+
 @admin.route('/resume/<int:resume_id>/download')
 @login_required
 def download_resume(resume_id):
@@ -88,12 +283,69 @@ def download_resume(resume_id):
         download_name=resume.original_filename
     )
 
+@admin.route('/resumes/export')
+@login_required
+def export_resumes():
+    """Download resumes as an Excel workbook, or as CSV with ?format=csv (filters: job_id, status)."""
+    job_id = request.args.get('job_id', type=int)
+    status = request.args.get('status')
+    status = None if status in (None, '', 'all') else status
+    filename = f"resumes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    if request.args.get('format') == 'csv':
+        return Response(stream_with_context(iter_resumes_csv(job_id, status)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+    
+    # A workbook is a zip archive, so it is written to a temporary file and sent from there
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        export_resumes_to_excel(job_id, path, status)
+    except Exception:
+        os.remove(path)
+        flash('The export failed. Please try again.', 'error')
+        return redirect(url_for('admin.manage_resumes'))
+    
+    def stream_file():
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(current_app.config['UPLOAD_CHUNK_SIZE'])
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+    
+    return Response(stream_with_context(stream_file()),
+                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                    headers={'Content-Disposition': f'attachment; filename={filename}.xlsx',
+                             'Content-Length': str(os.path.getsize(path))})
+
 @admin.route('/jobs')
 @login_required
 def manage_jobs():
     """View and manage all job postings."""
-    jobs = Job.query.order_by(Job.created_at.desc()).all()
-    return render_template('admin/jobs.html', jobs=jobs)
+    query = Job.query
+    status = request.args.get('status')
+    if status in ('active', 'inactive'):
+        query = query.filter(Job.is_active == (status == 'active'))
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(Job.title.ilike(f'%{q}%'))
+    
+    jobs = query.order_by(Job.created_at.desc()).all()
+    return render_template('admin/manage_jobs.html', jobs=jobs, job_stats=get_job_stats(job.id for job in jobs))
+
+@admin.route('/jobs/stats')
+@login_required
+def job_stats():
+    """Return applicant counts and score statistics per job (all jobs, or ?ids=1,2,3)."""
+    ids = [int(i) for i in request.args.get('ids', '').split(',') if i.isdigit()]
+    if not ids:
+        ids = [row.id for row in db.session.query(Job.id)]
+    
+    return jsonify({str(job_id): stats for job_id, stats in get_job_stats(ids).items()})
 
 @admin.route('/job/new', methods=['GET', 'POST'])
 @login_required
@@ -110,6 +362,7 @@ def new_job():
         
         db.session.add(job)
         db.session.commit()
+        invalidate_job_matrix()
         
         flash('Job posting created successfully!', 'success')
         return redirect(url_for('admin.manage_jobs'))
@@ -130,17 +383,42 @@ def edit_job(job_id):
     form = JobForm(obj=job)
     
     if form.validate_on_submit():
+        changed = (job.title, job.description, job.requirements) != \
+            (form.title.data, form.description.data, form.requirements.data)
         job.title = form.title.data
         job.description = form.description.data
         job.requirements = form.requirements.data
         
+        stale = 0
+        if changed:
+            job.version = (job.version or 1) + 1
+            # Scores stay marked stale until the rescoring task reaches them
+            stale = Resume.query.filter_by(job_id=job.id, status='processed') \
+                .update({Resume.score_stale: True}, synchronize_session=False)
         db.session.commit()
+        invalidate_job_matrix()
         
         flash('Job posting updated successfully!', 'success')
+        if stale:
+            task = enqueue('rescore_job', job_id=job.id)
+            flash(f'Rescoring {stale} resume(s) in the background (task {task.id}).', 'info')
         return redirect(url_for('admin.manage_jobs'))
     
     return render_template('admin/job_form.html', form=form, title='Edit Job Posting')
 
+@admin.route('/job/<int:job_id>/rank')
+@login_required
+def rank_job(job_id):
+    """Rank all processed resumes against a job and return the top k as JSON."""
+    job = Job.query.get_or_404(job_id)
+    k = min(max(request.args.get('k', 50, type=int), 1), 1000)
+    
+    return jsonify({
+        'job_id': job.id,
+        'k': k,
+        'results': rank_resumes(job, k)
+    })
+
 @admin.route('/job/<int:job_id>/delete', methods=['POST'])
 @login_required
 def delete_job(job_id):
@@ -152,6 +430,7 @@ def delete_job(job_id):
     
     db.session.delete(job)
     db.session.commit()
+    invalidate_job_matrix()
     
     flash('Job posting deleted successfully!', 'success')
     return redirect(url_for('admin.manage_jobs'))
@@ -164,6 +443,7 @@ def toggle_job(job_id):
     job.is_active = not job.is_active
     
     db.session.commit()
+    invalidate_job_matrix()
     
     status = 'activated' if job.is_active else 'deactivated'
     flash(f'Job posting {status} successfully!', 'success')
@@ -0,0 +1,41 @@
+import os
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URI = 'sqlite:///resume_screener.db'
+
+def database_uri():
+    """Database URI from SQLALCHEMY_DATABASE_URI or DATABASE_URL, SQLite by default."""
+    uri = os.getenv('SQLALCHEMY_DATABASE_URI') or os.getenv('DATABASE_URL') or DEFAULT_DATABASE_URI
+    if uri.startswith('postgres://'):
+        # Hosting providers still hand out the scheme SQLAlchemy dropped
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    options = {
+        'pool_pre_ping': True,  # replace connections the server closed while idle
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options['pool_size'] = config['DB_POOL_SIZE']
+        options['max_overflow'] = config['DB_MAX_OVERFLOW']
+    return options
+
+def configure_sqlite(engine, busy_timeout):
+    """
+    Put SQLite connections in WAL mode, so readers never block the writer, and
+    make writers wait up to busy_timeout seconds for the lock instead of failing.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout * 1000)}')
+        # Durable across application crashes in WAL mode; only an OS crash can lose the last commits
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
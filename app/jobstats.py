@@ -0,0 +1,365 @@
+import json
+from datetime import datetime
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import db, Resume, Job, JobStats
+from .tasks import task_handler, scheduled
+
+# Score histogram buckets of equal width over 0-100; the first and last are open-ended
+SCORE_BUCKETS = 10
+
+PENDING_STATUSES = ('pending', 'processing')
+
+# Resume columns the statistics are computed from
+COUNTED_COLUMNS = ('job_id', 'status', 'score')
+
+COUNTERS = ('applicants', 'processed', 'pending', 'errors')
+
+def _bucket_bounds():
+    width = 100 / SCORE_BUCKETS
+    return [(i * width if i else None, (i + 1) * width if i < SCORE_BUCKETS - 1 else None) for i in range(SCORE_BUCKETS)]
+
+def score_bucket(score):
+    """Index of the histogram bucket a score falls in."""
+    return min(max(int(score // (100 / SCORE_BUCKETS)), 0), SCORE_BUCKETS - 1)
+
+def _aggregate(job_ids=None):
+    """
+    Aggregate the resumes of jobs (all jobs with resumes by default) in SQL,
+    grouped by job_id. Returns {job_id: stats dict} including the score sum.
+    """
+    processed = Resume.status == 'processed'
+    processed_score = db.case((processed, Resume.score))
+
+    buckets = []
+    for low, high in _bucket_bounds():
+        in_bucket = db.and_(processed, Resume.score.isnot(None))
+        if low is not None:
+            in_bucket = db.and_(in_bucket, Resume.score >= low)
+        if high is not None:
+            in_bucket = db.and_(in_bucket, Resume.score < high)
+        buckets.append(db.func.count(db.case((in_bucket, Resume.id))))
+
+    query = db.select(
+        Resume.job_id,
+        db.func.count(Resume.id),
+        db.func.count(db.case((processed, Resume.id))),
+        db.func.count(db.case((Resume.status.in_(PENDING_STATUSES), Resume.id))),
+        db.func.count(db.case((Resume.status == 'error', Resume.id))),
+        db.func.sum(processed_score),
+        db.func.avg(processed_score),
+        db.func.max(processed_score),
+        *buckets
+    ).where(Resume.job_id.isnot(None)).group_by(Resume.job_id)
+
+    # Median: the middle one or two processed scores of each job, found with window functions
+    ranked = db.select(
+        Resume.job_id,
+        Resume.score,
+        db.func.row_number().over(partition_by=Resume.job_id, order_by=Resume.score).label('position'),
+        db.func.count().over(partition_by=Resume.job_id).label('size')
+    ).where(processed, Resume.score.isnot(None), Resume.job_id.isnot(None))
+    if job_ids is not None:
+        query = query.where(Resume.job_id.in_(job_ids))
+        ranked = ranked.where(Resume.job_id.in_(job_ids))
+    ranked = ranked.subquery()
+    medians = db.select(ranked.c.job_id, db.func.avg(ranked.c.score)).where(
+        ranked.c.position >= (ranked.c.size + 1) // 2,
+        ranked.c.position <= (ranked.c.size + 2) // 2
+    ).group_by(ranked.c.job_id)
+
+    median_by_job = dict(db.session.execute(medians).all())
+    stats = {}
+    for job_id, applicants, processed_count, pending, errors, score_sum, mean, maximum, *histogram in db.session.execute(query):
+        stats[job_id] = {
+            'applicants': applicants,
+            'processed': processed_count,
+            'pending': pending,
+            'errors': errors,
+            'score_sum': score_sum or 0.0,
+            'mean_score': round(mean, 2) if mean is not None else None,
+            'median_score': round(median_by_job[job_id], 2) if job_id in median_by_job else None,
+            'max_score': maximum,
+            'histogram': histogram,
+        }
+    return stats
+
+def compute_job_stats(job_ids=None):
+    """
+    Aggregate the resumes of jobs (all jobs with resumes by default) in SQL,
+    grouped by job_id. Returns {job_id: stats dict}; scores only count processed resumes.
+    """
+    stats = _aggregate(job_ids)
+    for values in stats.values():
+        del values['score_sum']
+    return stats
+
+def empty_stats():
+    return {'applicants': 0, 'processed': 0, 'pending': 0, 'errors': 0,
+            'mean_score': None, 'median_score': None, 'max_score': None, 'histogram': [0] * SCORE_BUCKETS}
+
+def _row_values(values):
+    values = dict(values, histogram=json.dumps(values['histogram']), updated_at=datetime.utcnow())
+    values.setdefault('score_sum', 0.0)
+    return values
+
+def _insert_stats(job_id, values):
+    """Insert the job_stats row of a job unless another transaction got there first. Returns whether it did."""
+    values = dict(_row_values(values), job_id=job_id)
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert
+        result = db.session.execute(insert(JobStats).values(**values).on_conflict_do_nothing(index_elements=['job_id']))
+        return result.rowcount == 1
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(JobStats).values(**values))
+    except IntegrityError:
+        return False
+    return True
+
+def _lock_stats(job_id):
+    """Load the job_stats row of a job, locked against concurrent updates until the commit."""
+    return db.session.get(JobStats, job_id, with_for_update=True, populate_existing=True)
+
+def refresh_job_stats(job_ids=None):
+    """Recompute the job_stats rows of jobs (all jobs by default), in the caller's transaction."""
+    if job_ids is not None:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+
+    jobs = db.select(Job.id)
+    rows = JobStats.query
+    if job_ids is not None:
+        jobs = jobs.where(Job.id.in_(job_ids))
+        rows = rows.filter(JobStats.job_id.in_(job_ids))
+    existing_jobs = set(db.session.scalars(jobs))
+    # Locked first, so increments committed meanwhile are either counted or wait for this refresh
+    rows = {row.job_id: row for row in rows.with_for_update().populate_existing()}
+    computed = _aggregate(job_ids)
+
+    for job_id in existing_jobs | set(rows):
+        row = rows.get(job_id)
+        if job_id not in existing_jobs:
+            db.session.delete(row)
+            continue
+        values = computed.get(job_id) or empty_stats()
+        if row is None:
+            if _insert_stats(job_id, values):
+                continue
+            row = _lock_stats(job_id)
+        for key, value in _row_values(values).items():
+            setattr(row, key, value)
+
+def _refresh_scores(row):
+    """Recompute the median and maximum score of a job with two queries over its processed resumes."""
+    scored = sum(json.loads(row.histogram))
+    if not scored:
+        row.median_score = row.max_score = None
+        return
+
+    query = db.select(Resume.score).where(
+        Resume.job_id == row.job_id, Resume.status == 'processed', Resume.score.isnot(None)
+    )
+    row.max_score = db.session.scalar(query.with_only_columns(db.func.max(Resume.score)))
+    middle = db.session.scalars(query.order_by(Resume.score).offset((scored - 1) // 2).limit(2 - scored % 2)).all()
+    row.median_score = round(sum(middle) / len(middle), 2) if middle else None
+
+def _apply_deltas(deltas):
+    """Add the per-job changes collected from flushed resumes to the job_stats rows."""
+    job_ids = set(db.session.scalars(db.select(Job.id).where(Job.id.in_(deltas))))
+    now = datetime.utcnow()
+    for job_id in sorted(job_ids):
+        delta = deltas[job_id]
+        row = _lock_stats(job_id)
+        if row is None:
+            # First change of this job: its row starts from the already flushed resumes
+            if _insert_stats(job_id, _aggregate([job_id]).get(job_id) or empty_stats()):
+                continue
+            row = _lock_stats(job_id)
+
+        for key in COUNTERS:
+            setattr(row, key, (getattr(row, key) or 0) + delta[key])
+        histogram = json.loads(row.histogram) if row.histogram else [0] * SCORE_BUCKETS
+        histogram = [count + change for count, change in zip(histogram, delta['histogram'])]
+        row.histogram = json.dumps(histogram)
+        row.score_sum = (row.score_sum or 0.0) + delta['score_sum']
+        scored = sum(histogram)
+        row.mean_score = round(row.score_sum / scored, 2) if scored else None
+        if delta['scores_changed']:
+            _refresh_scores(row)
+        row.updated_at = now
+
+def get_job_stats(job_ids):
+    """
+    Return {job_id: stats dict} for jobs, read from the job_stats table.
+    Jobs without a row yet are aggregated on the fly.
+    """
+    job_ids = list(job_ids)
+    stats = {}
+    for row in JobStats.query.filter(JobStats.job_id.in_(job_ids)):
+        stats[row.job_id] = {
+            'applicants': row.applicants,
+            'processed': row.processed,
+            'pending': row.pending,
+            'errors': row.errors,
+            'mean_score': row.mean_score,
+            'median_score': row.median_score,
+            'max_score': row.max_score,
+            'histogram': json.loads(row.histogram) if row.histogram else [0] * SCORE_BUCKETS,
+        }
+
+    missing = [job_id for job_id in job_ids if job_id not in stats]
+    if missing:
+        computed = compute_job_stats(missing)
+        for job_id in missing:
+            stats[job_id] = computed.get(job_id) or empty_stats()
+    return stats
+
+@scheduled('refresh_job_stats', 'JOB_STATS_REFRESH_INTERVAL')
+@task_handler('refresh_job_stats')
+def refresh_job_stats_task(job_ids=None):
+    """
+    Task handler recomputing the job_stats rows (all of them by default): rows
+    a bulk update dropped, and any drift of the incremental updates.
+    """
+    refresh_job_stats(job_ids)
+    db.session.commit()
+
+def _contribution(job_id, status, score):
+    """What one resume adds to the statistics of its job: (job_id, counters, scored value or None)."""
+    if job_id is None:
+        return None
+    counters = {
+        'applicants': 1,
+        'processed': int(status == 'processed'),
+        'pending': int(status in PENDING_STATUSES),
+        'errors': int(status == 'error'),
+    }
+    return job_id, counters, score if status == 'processed' and score is not None else None
+
+def _add_contribution(deltas, contribution, sign):
+    if contribution is None:
+        return
+    job_id, counters, score = contribution
+    delta = deltas.setdefault(job_id, {
+        **{key: 0 for key in COUNTERS},
+        'score_sum': 0.0, 'histogram': [0] * SCORE_BUCKETS, 'scores_changed': False
+    })
+    for key, value in counters.items():
+        delta[key] += sign * value
+    if score is not None:
+        delta['score_sum'] += sign * score
+        delta['histogram'][score_bucket(score)] += sign
+        delta['scores_changed'] = True
+
+def _counted_changes(instance):
+    state = db.inspect(instance)
+    return any(state.attrs[key].history.has_changes() for key in (*COUNTED_COLUMNS, 'job'))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_old_values(session, flush_context, instances):
+    # The rows still hold what changed resumes counted for before this flush
+    changed = [instance for instance in session.dirty if isinstance(instance, Resume) and _counted_changes(instance)]
+    changed += [instance for instance in session.deleted if isinstance(instance, Resume)]
+    ids = [instance.id for instance in changed if instance.id is not None]
+    if ids:
+        old = session.info.setdefault('job_stats_old', {})
+        rows = session.execute(db.select(Resume.id, Resume.job_id, Resume.status, Resume.score).where(Resume.id.in_(ids)))
+        for resume_id, *values in rows:
+            old[resume_id] = _contribution(*values)
+
+    deleted_jobs = [instance.id for instance in session.deleted if isinstance(instance, Job)]
+    if deleted_jobs:
+        session.execute(db.delete(JobStats).where(JobStats.job_id.in_(deleted_jobs)))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deltas(session, flush_context):
+    old = session.info.pop('job_stats_old', {})
+    deltas = session.info.setdefault('job_stats_deltas', {})
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(instance, Resume):
+            continue
+        if instance in session.dirty and instance.id not in old:
+            continue
+        before = old.get(instance.id)
+        after = None if instance in session.deleted else _contribution(instance.job_id, instance.status, instance.score)
+        if before != after:
+            _add_contribution(deltas, before, -1)
+            _add_contribution(deltas, after, 1)
+
+def _statement_columns(statement):
+    values = dict(getattr(statement, '_ordered_values', None) or ()) or getattr(statement, '_values', None) or {}
+    return {getattr(key, 'key', key): getattr(value, 'value', value) for key, value in values.items()}
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    # Bulk query.update()/delete() on resumes bypass the flush: their jobs' rows are dropped
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Resume:
+        return
+
+    statement = orm_execute_state.statement
+    columns = _statement_columns(statement) if orm_execute_state.is_update else {}
+    if orm_execute_state.is_update and not set(columns) & set(COUNTED_COLUMNS):
+        return
+
+    session = orm_execute_state.session
+    query = db.select(Resume.job_id).distinct().where(Resume.job_id.isnot(None))
+    if statement.whereclause is not None:
+        query = query.where(statement.whereclause)
+    dropped = session.info.setdefault('job_stats_dropped', set())
+    dropped.update(session.scalars(query))
+    if isinstance(columns.get('job_id'), int):
+        dropped.add(columns['job_id'])
+
+@event.listens_for(Session, 'before_commit')
+def _update_changed_jobs(session):
+    if session.info.get('job_stats_refreshing') or not has_app_context():
+        return
+    # The flush commit would run next anyway; a commit without resume changes stops here
+    session.flush()
+    deltas = session.info.pop('job_stats_deltas', {})
+    dropped = session.info.pop('job_stats_dropped', set())
+    deltas = {
+        job_id: delta for job_id, delta in deltas.items()
+        if job_id not in dropped and (delta['scores_changed'] or any(delta[key] for key in COUNTERS))
+    }
+    if not deltas and not dropped:
+        return
+
+    session.info['job_stats_refreshing'] = True
+    try:
+        if dropped:
+            # Read through the grouped aggregate until the scheduled refresh writes them again
+            session.execute(db.delete(JobStats).where(JobStats.job_id.in_(dropped)))
+        if deltas:
+            with session.no_autoflush:
+                _apply_deltas(deltas)
+        session.flush()
+    finally:
+        session.info.pop('job_stats_refreshing', None)
+        session.info.pop('job_stats_deltas', None)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_jobs(session):
+    for key in ('job_stats_old', 'job_stats_deltas', 'job_stats_dropped'):
+        session.info.pop(key, None)
+
+@click.command('refresh-job-stats')
+@with_appcontext
+def refresh_job_stats_command():
+    """Recompute the job_stats summary of every job."""
+    refresh_job_stats()
+    db.session.commit()
+    click.echo(f"Refreshed statistics of {JobStats.query.count()} jobs")
@@ -0,0 +1,91 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text, Text, bindparam
+from .models import db, Resume
+from .skills import set_resume_skills
+
+def upgrade_schema(db):
+    """
+    Bring an existing database up to date with the models.
+    db.create_all() only creates missing tables, so columns and indexes
+    added to existing tables are created here.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+@click.command('backfill-skills')
+@click.option('--batch-size', default=500, help='Resumes per commit.')
+@with_appcontext
+def backfill_skills_command(batch_size):
+    """Fill the resume_skills table from the JSON skills column of existing resumes."""
+    resume_ids = [row.id for row in db.session.query(Resume.id).filter(Resume.skills.isnot(None)).order_by(Resume.id)]
+    for start in range(0, len(resume_ids), batch_size):
+        for resume in Resume.query.filter(Resume.id.in_(resume_ids[start:start + batch_size])):
+            set_resume_skills(resume, resume.skills)
+        db.session.commit()
+
+    click.echo(f"Indexed skills of {len(resume_ids)} resumes")
+
+# Resume columns holding PackedJSON values
+PACKED_COLUMNS = ('skills', 'experience', 'education', 'matched_keywords', 'missing_keywords')
+
+@click.command('pack-resume-data')
+@click.option('--batch-size', default=1000, help='Resumes rewritten per commit.')
+@with_appcontext
+def pack_resume_data_command(batch_size):
+    """Convert resume data stored as JSON text to the packed representation."""
+    engine = db.engine
+    table = Resume.__table__
+
+    if engine.dialect.name != 'sqlite':
+        # Server databases store the values in native JSON columns
+        text_columns = [column['name'] for column in inspect(engine).get_columns(table.name)
+                        if column['name'] in PACKED_COLUMNS and isinstance(column['type'], Text)]
+        json_type = 'JSONB' if engine.dialect.name == 'postgresql' else 'JSON'
+        with engine.begin() as conn:
+            for name in text_columns:
+                if engine.dialect.name == 'postgresql':
+                    conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {name} TYPE {json_type} USING {name}::jsonb'))
+                else:
+                    conn.execute(text(f'ALTER TABLE {table.name} MODIFY {name} {json_type}'))
+        click.echo(f"Converted {len(text_columns)} columns to {json_type}")
+        return
+
+    # SQLite keeps old rows as JSON text next to packed blobs; rewrite them in id order
+    unpacked = db.or_(*(db.func.typeof(table.c[name]) == 'text' for name in PACKED_COLUMNS))
+    update = table.update().where(table.c.id == bindparam('resume_id')) \
+        .values({name: bindparam(name, type_=table.c[name].type) for name in PACKED_COLUMNS})
+
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, *(table.c[name] for name in PACKED_COLUMNS))
+            .where(unpacked, table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(update, [
+            {'resume_id': row.id, **{name: getattr(row, name) for name in PACKED_COLUMNS}} for row in rows
+        ])
+        db.session.commit()
+        converted += len(rows)
+        last_id = rows[-1].id
+
+    click.echo(f"Packed data of {converted} resumes")
@@ -0,0 +1,225 @@
+import re
+import threading
+import time
+import zlib
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from .models import db, Resume
+from .textstore import get_text_store, text_key
+
+# Signature layout: NUM_BANDS bands of ROWS_PER_BAND hashes. Changing either
+# invalidates the signatures already stored in the database.
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so signatures computed in different processes are comparable
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def shingle_hashes(text):
+    """32-bit hashes of the word shingles of a text."""
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        words = words + [''] * (SHINGLE_SIZE - len(words))
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+def minhash_signature(text):
+    """MinHash signature of a text as bytes, NUM_PERMUTATIONS 32-bit values."""
+    hashes = shingle_hashes(text or '')
+    # One row per permutation: (a * h + b) mod p, reduced to 32 bits
+    permuted = ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32).tobytes()
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(np.frombuffer(signature, dtype=np.uint32) == np.frombuffer(other, dtype=np.uint32)))
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing index over MinHash signatures.
+    Each signature is split into bands; resumes sharing any whole band are
+    candidates, so a lookup only compares against a few signatures.
+    """
+
+    # Seconds between full reloads, which pick up signatures other processes
+    # changed below the high-water mark (reprocessing, backfill-minhash)
+    FULL_SYNC_INTERVAL = 3600
+
+    # Unsigned resumes looked up per query
+    SYNC_BATCH_SIZE = 500
+
+    def __init__(self):
+        self._buckets = [{} for _ in range(NUM_BANDS)]
+        self._signatures = {}
+        self._lock = threading.Lock()
+        # Every signed resume up to this id is loaded, the unsigned ones are in _unsigned
+        self.last_id = 0
+        self._unsigned = set()
+        self._next_full_sync = 0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature):
+        size = ROWS_PER_BAND * 4
+        return [signature[i * size:(i + 1) * size] for i in range(NUM_BANDS)]
+
+    def add(self, resume_id, signature):
+        """Index a resume's signature."""
+        with self._lock:
+            if resume_id in self._signatures:
+                self._remove(resume_id)
+            self._signatures[resume_id] = signature
+            for buckets, band in zip(self._buckets, self._bands(signature)):
+                buckets.setdefault(band, set()).add(resume_id)
+
+    def remove(self, resume_id):
+        """Drop a resume from the index."""
+        with self._lock:
+            self._remove(resume_id)
+
+    def _remove(self, resume_id):
+        signature = self._signatures.pop(resume_id, None)
+        if signature is None:
+            return
+        for buckets, band in zip(self._buckets, self._bands(signature)):
+            bucket = buckets.get(band)
+            if bucket:
+                bucket.discard(resume_id)
+                if not bucket:
+                    del buckets[band]
+
+    def query(self, signature, threshold):
+        """Return (resume id, similarity) of indexed resumes at or above threshold, most similar first."""
+        with self._lock:
+            candidates = set()
+            for buckets, band in zip(self._buckets, self._bands(signature)):
+                candidates.update(buckets.get(band, ()))
+            scored = [(resume_id, estimate_similarity(signature, self._signatures[resume_id]))
+                      for resume_id in candidates]
+        return sorted((match for match in scored if match[1] >= threshold), key=lambda match: (-match[1], match[0]))
+
+    def sync(self):
+        """
+        Add the signatures stored since the last sync, by this or other processes.
+        Only resumes above the high-water mark are read. Those still waiting for
+        processing are remembered and looked up by id until their signature is
+        stored, so the mark never waits for them. Deleted resumes are removed
+        explicitly (remove_from_lsh_index) or when a lookup finds them gone.
+        """
+        now = time.monotonic()
+        if now >= self._next_full_sync:
+            with self._lock:
+                self._buckets = [{} for _ in range(NUM_BANDS)]
+                self._signatures = {}
+            self.last_id = 0
+            self._unsigned = set()
+            self._next_full_sync = now + self.FULL_SYNC_INTERVAL
+
+        waiting = Resume.status.in_(('pending', 'processing'))
+        rows = db.session.query(Resume.id, Resume.minhash, waiting.label('waiting')) \
+            .filter(Resume.id > self.last_id, db.or_(Resume.minhash.isnot(None), waiting)).order_by(Resume.id).all()
+        if rows:
+            self.last_id = rows[-1].id
+
+        # Resumes passed by the mark earlier that were signed or gave up since
+        unsigned = sorted(self._unsigned)
+        for start in range(0, len(unsigned), self.SYNC_BATCH_SIZE):
+            rows += db.session.query(Resume.id, Resume.minhash, waiting.label('waiting')).filter(
+                Resume.id.in_(unsigned[start:start + self.SYNC_BATCH_SIZE]),
+                db.or_(Resume.minhash.isnot(None), ~waiting)
+            ).all()
+
+        for row in rows:
+            if row.minhash is not None:
+                self._unsigned.discard(row.id)
+                if self._signatures.get(row.id) != row.minhash:
+                    self.add(row.id, row.minhash)
+            elif row.waiting:
+                self._unsigned.add(row.id)
+            else:
+                # Ended in error: no signature is coming
+                self._unsigned.discard(row.id)
+
+def get_lsh_index():
+    """Return the near-duplicate index of the current app, synced with the database."""
+    app = current_app._get_current_object()
+    if 'lsh_index' not in app.extensions:
+        app.extensions['lsh_index'] = LSHIndex()
+    index = app.extensions['lsh_index']
+    index.sync()
+    return index
+
+def remove_from_lsh_index(resume_id):
+    """Drop a deleted resume from this process's index, if it has one."""
+    index = current_app.extensions.get('lsh_index')
+    if index is not None:
+        index.remove(resume_id)
+
+def cluster_root(resume_id):
+    """
+    Id of the first resume of the near-duplicate cluster a resume belongs to,
+    or None if the resume was deleted or lost its signature since it was indexed.
+    """
+    row = db.session.query(Resume.near_duplicate_of_id, Resume.duplicate_of_id) \
+        .filter(Resume.id == resume_id, Resume.minhash.isnot(None)).first()
+    if row is None:
+        return None
+    # An exact copy belongs to the cluster of its original
+    return row.near_duplicate_of_id or row.duplicate_of_id or resume_id
+
+def index_near_duplicates(resumes, texts, index=None):
+    """
+    Store the MinHash signature of each resume and link it to the cluster of
+    the most similar earlier resume at or above NEAR_DUPLICATE_THRESHOLD.
+    """
+    if index is None:
+        index = get_lsh_index()
+    threshold = current_app.config['NEAR_DUPLICATE_THRESHOLD']
+
+    for resume, text in zip(resumes, texts):
+        resume.minhash = minhash_signature(text)
+        resume.near_duplicate_of_id = None
+        for match_id, _ in index.query(resume.minhash, threshold):
+            # Only older resumes, so reprocessing never links a cluster root to its own members.
+            # Exact copies are already linked through duplicate_of_id.
+            if match_id >= resume.id or match_id == resume.duplicate_of_id:
+                continue
+            root = cluster_root(match_id)
+            if root is None:
+                # Deleted or replaced in another process since it was loaded
+                index.remove(match_id)
+                continue
+            resume.near_duplicate_of_id = root
+            break
+        index.add(resume.id, resume.minhash)
+
+@click.command('backfill-minhash')
+@click.option('--batch-size', default=500, help='Resumes signed per commit.')
+@with_appcontext
+def backfill_minhash_command(batch_size):
+    """Compute near-duplicate signatures for processed resumes that have none."""
+    store = get_text_store()
+    index = get_lsh_index()
+    resume_ids = [row.id for row in db.session.query(Resume.id)
+                  .filter(Resume.status == 'processed', Resume.minhash.is_(None)).order_by(Resume.id)]
+
+    for start in range(0, len(resume_ids), batch_size):
+        resumes = Resume.query.filter(Resume.id.in_(resume_ids[start:start + batch_size])).order_by(Resume.id).all()
+        index_near_duplicates(resumes, [store.get(text_key(resume)) or '' for resume in resumes], index)
+        db.session.commit()
+
+    click.echo(f"Signed {len(resume_ids)} resumes")
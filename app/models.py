@@ -2,6 +2,7 @@ from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db, login_manager
+from .packed import PackedJSON, PackedAttribute
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
@@ -21,6 +22,24 @@ class User(UserMixin, db.Model):
         """Check hashed password."""
         return check_password_hash(self.password_hash, password)
 
+# Skills found in each resume, for indexed filtering by skill
+resume_skills = db.Table(
+    'resume_skills',
+    db.Column('resume_id', db.Integer, db.ForeignKey('resumes.id'), primary_key=True),
+    db.Column('skill_id', db.Integer, db.ForeignKey('skills.id'), primary_key=True),
+    db.Index('ix_resume_skills_skill_id', 'skill_id', 'resume_id')
+)
+
+class Skill(db.Model):
+    """Normalized skill name shared by all resumes that list it."""
+    __tablename__ = 'skills'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    
+    def __repr__(self):
+        return f'<Skill {self.name}>'
+
 class Resume(db.Model):
     """Resume model to store resume information."""
     __tablename__ = 'resumes'
@@ -29,29 +48,63 @@ class Resume(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='pending')  # pending, processed, error
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    status = db.Column(db.String(20), default='pending')  # pending, processing, processed, error
+    file_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded file
     
     # Extracted information
     name = db.Column(db.String(100))
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
-    skills = db.Column(db.Text)  # JSON string of skills
-    experience = db.Column(db.Text)  # JSON string of experience
-    education = db.Column(db.Text)  # JSON string of education
+    # Lists and dicts, packed in the database and decoded on first access
+    _skills = db.Column('skills', PackedJSON)
+    _experience = db.Column('experience', PackedJSON)
+    _education = db.Column('education', PackedJSON)
+    skills = db.synonym('_skills', descriptor=PackedAttribute('_skills'))  # list of skill names
+    experience = db.synonym('_experience', descriptor=PackedAttribute('_experience'))  # dict: start_date, end_date, date_ranges, most_recent_title
+    education = db.synonym('_education', descriptor=PackedAttribute('_education'))  # dict: degrees and schools lists
     
     # Scoring
     score = db.Column(db.Float, default=0.0)
-    matched_keywords = db.Column(db.Text)  # JSON string of matched keywords
-    missing_keywords = db.Column(db.Text)  # JSON string of missing keywords
+    _matched_keywords = db.Column('matched_keywords', PackedJSON)
+    _missing_keywords = db.Column('missing_keywords', PackedJSON)
+    matched_keywords = db.synonym('_matched_keywords', descriptor=PackedAttribute('_matched_keywords'))
+    missing_keywords = db.synonym('_missing_keywords', descriptor=PackedAttribute('_missing_keywords'))
+    score_stale = db.Column(db.Boolean, default=False)  # job changed since the score was computed
     
     # Relationships
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'))
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('resumes.id'), index=True)  # first resume with the same file content
+    near_duplicate_of_id = db.Column(db.Integer, db.ForeignKey('resumes.id'), index=True)  # first resume of its near-duplicate cluster
+    minhash = db.Column(db.LargeBinary)  # MinHash signature of the extracted text
+    
+    duplicate_of = db.relationship('Resume', remote_side=[id], foreign_keys=[duplicate_of_id])
+    skill_set = db.relationship('Skill', secondary=resume_skills, lazy='select')
+    
+    __table_args__ = (
+        # Also serve filters on job_id or status alone
+        db.Index('ix_resumes_job_id_score', 'job_id', 'score'),
+        db.Index('ix_resumes_status_upload_date', 'status', 'upload_date'),
+    )
     
     def __repr__(self):
         return f'<Resume {self.filename}>'
 
+def resume_list_query():
+    """
+    Resume query for list pages: each resume's job comes in the same query,
+    and the large columns lists never show are only loaded on access.
+    """
+    return Resume.query.options(
+        db.joinedload(Resume.job),
+        db.defer(Resume.experience),
+        db.defer(Resume.education),
+        db.defer(Resume.matched_keywords),
+        db.defer(Resume.missing_keywords),
+        db.defer(Resume.minhash)
+    )
+
 class Job(db.Model):
     """Job description model."""
     __tablename__ = 'jobs'
@@ -60,8 +113,9 @@ class Job(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     requirements = db.Column(db.Text)  # JSON string of required skills/qualifications
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, default=1)  # bumped when the job text changes
     
     # Relationships
     resumes = db.relationship('Resume', backref='job', lazy=True)
@@ -69,6 +123,45 @@ class Job(db.Model):
     def __repr__(self):
         return f'<Job {self.title}>'
 
+class JobStats(db.Model):
+    """Applicant counts and score statistics of a job, updated incrementally as its resumes change."""
+    __tablename__ = 'job_stats'
+    
+    job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), primary_key=True)
+    applicants = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    pending = db.Column(db.Integer, default=0)  # pending or processing
+    errors = db.Column(db.Integer, default=0)
+    score_sum = db.Column(db.Float, default=0.0)  # of processed resumes, for the running mean
+    mean_score = db.Column(db.Float)
+    median_score = db.Column(db.Float)
+    max_score = db.Column(db.Float)
+    histogram = db.Column(db.Text)  # JSON list of processed resumes per score bucket
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<JobStats {self.job_id}>'
+
+class Task(db.Model):
+    """Background task queued for the worker pool."""
+    __tablename__ = 'tasks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, index=True)
+    payload = db.Column(db.Text)  # JSON string of handler arguments
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed, skipped
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, default=0)  # items done, reported by long-running handlers
+    total = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # last sign of life from the process running it
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Task {self.kind} {self.id}>'
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -0,0 +1,80 @@
+import json
+
+from sqlalchemy.types import TypeDecorator, Text, JSON
+
+try:
+    import orjson
+except ImportError:  # optional, several times faster than the json module
+    orjson = None
+
+def pack(value):
+    """Encode a list or dict as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def unpack(data):
+    """Decode packed bytes, or JSON text stored before packing was introduced."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class PackedJSON(TypeDecorator):
+    """
+    Lists and dicts stored in the most compact form the database offers.
+    Native JSON columns where the backend has them; on SQLite a blob of
+    compact JSON bytes that is only decoded when the attribute is read
+    (see PackedAttribute). Rows still holding JSON text read the same way.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'sqlite':
+            # SQLite columns take any storage class: blobs for packed values, text for old rows
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name == 'sqlite':
+            if value is None or isinstance(value, bytes):
+                return value
+            return pack(unpack(value) if isinstance(value, str) else value)
+        return unpack(value) if isinstance(value, (bytes, str)) else value
+
+    def coerce_compared_value(self, op, value):
+        # LIKE patterns and other plain strings compare against the stored text
+        return Text() if isinstance(value, str) else self
+
+    def process_result_value(self, value, dialect):
+        # Left encoded: PackedAttribute decodes on first access
+        return value
+
+class PackedAttribute:
+    """
+    Instance attribute over a PackedJSON column: decodes the stored value on
+    first access and keeps the result until the column changes. Assign lists
+    or dicts; they are packed when the row is written.
+    """
+
+    def __init__(self, column_name):
+        self.column_name = column_name
+        self.cache_name = f'_decoded{column_name}'
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        raw = getattr(instance, self.column_name)
+        if not isinstance(raw, (bytes, str)):
+            return raw
+
+        cached = instance.__dict__.get(self.cache_name)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = unpack(raw)
+        instance.__dict__[self.cache_name] = (raw, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.column_name, value)
@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+from flask import current_app
+from .models import db, Resume, Job
+from .scoring import get_vectorizer, model_stamp, job_text
+from .tasks import enqueue_unique
+from .textstore import get_text_store, text_key
+from .utils import get_job_profile
+from .vectorstore import get_vector_store
+
+class JobMatrix:
+    """
+    TF-IDF vectors of the active jobs, one row per job.
+    Rebuilt after jobs are created, edited or toggled, and when the model is refit.
+    """
+
+    def __init__(self):
+        self.vectorizer = None
+        self.versions = ()
+        self.matrix = None
+        self.stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Rebuild the matrix on its next use."""
+        self.stale = True
+
+    def get(self, vectorizer):
+        """Return (job ids, matrix) for the active jobs, rebuilding them if needed."""
+        # Jobs created, edited or toggled in another process change the active ids or versions
+        versions = tuple((row.id, row.version) for row in
+                         db.session.query(Job.id, Job.version).filter_by(is_active=True).order_by(Job.id))
+
+        with self._lock:
+            if self.stale or vectorizer is not self.vectorizer or versions != self.versions:
+                job_ids = [job_id for job_id, _ in versions]
+                jobs = Job.query.filter(Job.id.in_(job_ids)).order_by(Job.id).all() if job_ids else []
+                self.vectorizer = vectorizer
+                self.versions = tuple((job.id, job.version) for job in jobs)
+                self.matrix = vectorizer.transform([job_text(job) for job in jobs]) if jobs else None
+                self.stale = False
+            return np.array([job_id for job_id, _ in self.versions], dtype=np.int64), self.matrix
+
+# Active job matrix of this process
+_job_matrix = JobMatrix()
+
+def get_model():
+    """Return the corpus vectorizer. Until there is one, a refit is queued and None returned."""
+    vectorizer = get_vectorizer()
+    if vectorizer is None:
+        enqueue_unique('refit_model')
+        # Tasks running inline have fitted it by now
+        vectorizer = get_vectorizer()
+    return vectorizer
+
+def resume_scores(vectorizer, job_vector):
+    """
+    Cosine similarity of every processed resume with a job vector, as (resume ids, percentages).
+    Only reads the store: processing, deletes and refits keep it current.
+    """
+    snapshot = get_vector_store().snapshot()
+    if snapshot is None or snapshot.model != model_stamp(vectorizer):
+        # A refit has not rebuilt the store for this model yet
+        current_app.logger.warning("Resume vectors are not built for the current model yet")
+        enqueue_unique('sync_vectors')
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # Rows are L2-normalised, so one sparse product over the mapped store gives all cosine similarities
+    scores = (snapshot.matrix @ job_vector.T).toarray().ravel() * 100
+    return snapshot.ids, scores[snapshot.records]
+
+def invalidate_job_matrix():
+    """Mark the active job matrix for rebuilding after a job was changed."""
+    _job_matrix.invalidate()
+
+def top_k(ids, scores, k):
+    """Return (ids, scores) of the k highest scores, best first."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return ids[order], scores[order]
+
+def rank_resumes(job, k=50):
+    """
+    Score every processed resume against a job and return the best k,
+    with the job keywords each resume matches and misses.
+    """
+    vectorizer = get_model()
+    if vectorizer is None:
+        return []
+
+    profile = get_job_profile(job)
+    job_vector = profile.vector if profile.vectorizer is vectorizer else vectorizer.transform([job_text(job)])
+    ids, scores = resume_scores(vectorizer, job_vector)
+    best_ids, best_scores = top_k(ids, scores, k)
+
+    # Exact duplicates have no vector of their own: they score as their original
+    copies = db.session.query(Resume.id, Resume.duplicate_of_id) \
+        .filter(Resume.duplicate_of_id.in_(best_ids.tolist()), Resume.status == 'processed').all()
+    if copies:
+        score_of = dict(zip(best_ids.tolist(), best_scores.tolist()))
+        best_ids, best_scores = top_k(
+            np.concatenate([best_ids, np.array([copy.id for copy in copies], dtype=best_ids.dtype)]),
+            np.concatenate([best_scores, np.array([score_of[copy.duplicate_of_id] for copy in copies], dtype=best_scores.dtype)]),
+            k
+        )
+
+    job_keywords = profile.keywords
+    resumes = {resume.id: resume for resume in Resume.query.filter(Resume.id.in_(best_ids.tolist()))}
+
+    results = []
+    for resume_id, score in zip(best_ids.tolist(), best_scores.tolist()):
+        resume = resumes.get(resume_id)
+        if not resume:
+            continue
+        skills = resume.skills or []
+        results.append({
+            'resume_id': resume.id,
+            'name': resume.name,
+            'email': resume.email,
+            'job_id': resume.job_id,
+            'score': round(score, 2),
+            'matched_keywords': [skill for skill in skills if skill in job_keywords],
+            'missing_keywords': [skill for skill in job_keywords if skill not in skills],
+        })
+
+    return results
+
+def recommend_jobs(resume, k=5):
+    """Return the k active jobs that best match a resume as (job, score) pairs."""
+    text = get_text_store().get(text_key(resume))
+    vectorizer = get_model() if text else None
+    if vectorizer is None:
+        return []
+
+    job_ids, job_matrix = _job_matrix.get(vectorizer)
+    if job_matrix is None:
+        return []
+
+    # Job rows and the resume vector are L2-normalised: one product scores every job
+    scores = (job_matrix @ vectorizer.transform([text]).T).toarray().ravel() * 100
+    best_ids, best_scores = top_k(job_ids, scores, k)
+
+    jobs = {job.id: job for job in Job.query.filter(Job.id.in_(best_ids.tolist()))}
+    return [(jobs[job_id], round(score, 2))
+            for job_id, score in zip(best_ids.tolist(), best_scores.tolist())
+            if job_id in jobs and score > 0]
@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, send_from_directory, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from flask_login import login_required, current_user
+from datetime import datetime
+import base64
+import json
 import os
-import uuid
 from .models import db, Resume, Job
-from .utils import allowed_file, process_resume
+from .utils import allowed_file, save_resume_file
+from .tasks import enqueue_resume
+from .ranking import recommend_jobs
+from .jobstats import get_job_stats
 
 main = Blueprint('main', __name__)
 
@@ -32,29 +37,28 @@ def upload_file():
         return redirect(request.url)
     
     if file and allowed_file(file.filename):
-        # Generate unique filename
+        # Save file under a unique filename
         filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # Save file
-        file.save(filepath)
+        unique_filename, filepath, file_hash = save_resume_file(file.stream, filename)
         
         # Create resume record
         resume = Resume(
             filename=unique_filename,
             file_path=filepath,
             original_filename=filename,
-            user_id=current_user.id if current_user.is_authenticated else None
+            file_hash=file_hash,
+            status='pending',
+            user_id=current_user.id if current_user.is_authenticated else None,
+            job_id=request.form.get('job_id', type=int) or None
         )
         
         db.session.add(resume)
         db.session.commit()
         
-        # Process resume in background
-        process_resume(resume.id)
+        # Hand the resume to the worker pool; it stays 'pending' until picked up
+        enqueue_resume(resume.id)
         
-        flash('Resume uploaded successfully!', 'success')
+        flash('Resume uploaded successfully! It will be analyzed shortly.', 'success')
         return redirect(url_for('main.view_resume', resume_id=resume.id))
     
     flash('Invalid file type. Please upload a PDF or DOCX file.', 'error')
@@ -71,30 +75,107 @@ def view_resume(resume_id):
         flash('You do not have permission to view this resume.', 'error')
         return redirect(url_for('main.index'))
     
-    return render_template('view_resume.html', resume=resume)
+    recommended_jobs = recommend_jobs(resume) if resume.status == 'processed' else []
+    
+    return render_template('view_resume.html', resume=resume, recommended_jobs=recommended_jobs)
+
+# Columns returned by /api/resumes
+API_RESUME_COLUMNS = (Resume.id, Resume.original_filename, Resume.upload_date, Resume.status, Resume.score, Resume.job_id)
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after a row in (upload_date, id) order."""
+    return base64.urlsafe_b64encode(f"{row.upload_date.isoformat()}|{row.id}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (upload_date, id) from a cursor, or raise ValueError."""
+    upload_date, resume_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(upload_date), int(resume_id)
+
+def resumes_after(query, after, limit):
+    """Next rows of a resume query, newest first, after a (upload_date, id) position."""
+    if after:
+        upload_date, resume_id = after
+        # Keyset condition: served by the upload_date indexes, never an OFFSET scan
+        query = query.filter(db.or_(
+            Resume.upload_date < upload_date,
+            db.and_(Resume.upload_date == upload_date, Resume.id < resume_id)
+        ))
+    return query.order_by(Resume.upload_date.desc(), Resume.id.desc()).limit(limit).all()
+
+def resume_json(row):
+    return {
+        'id': row.id,
+        'filename': row.original_filename,
+        'upload_date': row.upload_date.isoformat(),
+        'status': row.status,
+        'score': row.score,
+        'job_id': row.job_id
+    }
 
 @main.route('/api/resumes')
 @login_required
 def get_resumes():
-    """API endpoint to get all resumes for the current user."""
-    if current_user.is_admin:
-        resumes = Resume.query.all()
-    else:
-        resumes = Resume.query.filter_by(user_id=current_user.id).all()
+    """
+    API endpoint listing resumes, newest first, one page per call.
+    Filters: status, job_id, min_score, max_score. Pass the returned next_cursor
+    as cursor for the next page. With format=ndjson (or Accept: application/x-ndjson)
+    every matching resume is streamed instead, one JSON object per line.
+    """
+    query = db.session.query(*API_RESUME_COLUMNS)
+    if not current_user.is_admin:
+        query = query.filter(Resume.user_id == current_user.id)
+    
+    status = request.args.get('status')
+    job_id = request.args.get('job_id', type=int)
+    min_score = request.args.get('min_score', type=float)
+    max_score = request.args.get('max_score', type=float)
+    if status:
+        query = query.filter(Resume.status == status)
+    if job_id:
+        query = query.filter(Resume.job_id == job_id)
+    if min_score is not None:
+        query = query.filter(Resume.score >= min_score)
+    if max_score is not None:
+        query = query.filter(Resume.score <= max_score)
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    ndjson = request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    if ndjson:
+        batch_size = current_app.config['API_STREAM_BATCH_SIZE']
+        
+        def generate(after):
+            # One keyset page at a time, so memory stays flat however many rows match
+            while True:
+                rows = resumes_after(query, after, batch_size)
+                for row in rows:
+                    yield json.dumps(resume_json(row)) + '\n'
+                if len(rows) < batch_size:
+                    return
+                after = (rows[-1].upload_date, rows[-1].id)
+        
+        return Response(stream_with_context(generate(after)), mimetype='application/x-ndjson')
     
-    return jsonify([{
-        'id': r.id,
-        'filename': r.original_filename,
-        'upload_date': r.upload_date.isoformat(),
-        'status': r.status,
-        'score': r.score
-    } for r in resumes])
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    rows = resumes_after(query, after, limit)
+    return jsonify({
+        'resumes': [resume_json(row) for row in rows],
+        'next_cursor': encode_cursor(rows[-1]) if len(rows) == limit else None
+    })
 
 @main.route('/jobs')
 def list_jobs():
     """List all active job postings."""
     jobs = Job.query.filter_by(is_active=True).all()
-    return render_template('jobs.html', jobs=jobs)
+    # Only admins see the statistics
+    job_stats = get_job_stats(job.id for job in jobs) if current_user.is_authenticated and current_user.is_admin else {}
+    return render_template('jobs.html', jobs=jobs, job_stats=job_stats)
 
 @main.route('/job/<int:job_id>')
 def view_job(job_id):
@@ -106,7 +187,24 @@ def view_job(job_id):
 @login_required
 def profile():
     """User profile page."""
-    return render_template('profile.html', user=current_user)
+    # Totals over every resume the list can page through, not just the first page
+    query = db.session.query(
+        db.func.count(Resume.id),
+        db.func.count(db.case((Resume.status == 'processed', Resume.id))),
+        db.func.count(db.case((Resume.status.in_(('pending', 'processing')), Resume.id))),
+        db.func.avg(Resume.score)
+    )
+    if not current_user.is_admin:
+        query = query.filter(Resume.user_id == current_user.id)
+    total, processed, pending, avg_score = query.one()
+    
+    stats = {
+        'total': total,
+        'processed': processed,
+        'pending': pending,
+        'avg_score': round(avg_score) if processed and avg_score is not None else 0
+    }
+    return render_template('profile.html', user=current_user, stats=stats)
 
 @main.route('/download/<int:resume_id>')
 @login_required
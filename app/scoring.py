@@ -0,0 +1,147 @@
+import os
+import threading
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .models import db, Resume, Job
+from .tasks import task_handler, scheduled, enqueue_many, TaskSkipped
+from .textstore import get_text_store, text_key
+
+# Vectorizers loaded in this process, keyed by model path: (mtime, vectorizer)
+_models = {}
+_models_lock = threading.Lock()
+
+def job_text(job):
+    """Text of a job posting used for scoring."""
+    return f"{job.title} {job.description} {job.requirements}"
+
+def iter_corpus():
+    """Yield the text of every job and every distinct processed resume."""
+    for job in Job.query.order_by(Job.id).yield_per(500):
+        yield job_text(job)
+
+    store = get_text_store()
+    seen = set()
+    for resume in Resume.query.filter_by(status='processed').order_by(Resume.id).yield_per(500):
+        key = text_key(resume)
+        if key in seen:
+            continue
+        seen.add(key)
+        text = store.get(key)
+        if text:
+            yield text
+
+def fit_model():
+    """
+    Fit the TF-IDF vectorizer over the whole corpus and save it to TFIDF_MODEL_PATH.
+    Returns the number of documents the model was fitted on.
+    """
+    import joblib
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    documents = list(iter_corpus())
+    if len(documents) < 2:
+        current_app.logger.warning("Not enough jobs and resumes to fit the TF-IDF model yet")
+        return 0
+
+    vectorizer = TfidfVectorizer(
+        stop_words='english',
+        max_features=current_app.config['TFIDF_MAX_FEATURES'] or None,
+        dtype=np.float32
+    )
+    vectorizer.fit(documents)
+
+    path = current_app.config['TFIDF_MODEL_PATH']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Workers reload the model when the file changes, so never let them see a partial one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(vectorizer, tmp_path)
+    os.replace(tmp_path, path)
+
+    current_app.logger.info(f"Fitted TF-IDF model on {len(documents)} documents "
+                            f"({len(vectorizer.vocabulary_)} terms)")
+    return len(documents)
+
+def get_vectorizer():
+    """
+    Return the corpus vectorizer, loading it once per process and again
+    after a refit replaced the file. Returns None until a model was fitted.
+    """
+    path = current_app.config['TFIDF_MODEL_PATH']
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    cached = _models.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _models_lock:
+        cached = _models.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        import joblib
+        vectorizer = joblib.load(path)
+        _models[path] = (mtime, vectorizer)
+        return vectorizer
+
+def model_stamp(vectorizer):
+    """Identifier of a loaded model that is the same in every process, for data derived from it."""
+    for mtime, loaded in list(_models.values()):
+        if loaded is vectorizer:
+            return repr(mtime)
+    return None
+
+def similarity(vectorizer, resume_text, job_description):
+    """Cosine similarity of two texts under a fitted vectorizer, as a percentage."""
+    # Rows come out L2-normalised, so the dot product is the cosine similarity
+    vectors = vectorizer.transform([resume_text, job_description])
+    return round(float(vectors[0].multiply(vectors[1]).sum()) * 100, 2)
+
+def similarities(vectorizer, texts, job_vector):
+    """Cosine similarities of many texts with a job vector, as percentages."""
+    vectors = vectorizer.transform(texts)
+    return [round(float(score) * 100, 2) for score in (vectors @ job_vector.T).toarray().ravel()]
+
+def queue_rescore():
+    """Mark the scores of all processed resumes stale and queue a rescore of every job they were submitted for."""
+    processed = Resume.query.filter(Resume.status == 'processed', Resume.job_id.isnot(None))
+    job_ids = [job_id for (job_id,) in processed.with_entities(Resume.job_id).distinct().order_by(Resume.job_id)]
+    processed.update({Resume.score_stale: True}, synchronize_session=False)
+    # Committed with the tasks; a running dispatcher picks them up
+    enqueue_many('rescore_job', [{'job_id': job_id} for job_id in job_ids], wake=False)
+    return len(job_ids)
+
+def refit_model():
+    """
+    Refit the corpus model, re-vectorize the stored resumes with it and queue a
+    rescore, so no stored score is left from the previous model.
+    Returns the number of documents fitted, 0 if there were too few.
+    """
+    from .vectorstore import sync_vector_store
+    documents = fit_model()
+    if documents:
+        sync_vector_store(get_vectorizer())
+        queue_rescore()
+    return documents
+
+@scheduled('refit_model', 'TFIDF_REFIT_INTERVAL')
+@task_handler('refit_model')
+def refit_model_task():
+    """Task handler for refit_model. A refit without enough documents is retried instead of waiting a full interval."""
+    if not refit_model():
+        raise TaskSkipped("Not enough jobs and resumes to fit the TF-IDF model yet")
+
+@click.command('refit-model')
+@with_appcontext
+def refit_model_command():
+    """Fit the TF-IDF scoring model over all jobs and processed resumes."""
+    documents = refit_model()
+    if documents:
+        click.echo(f"Fitted model on {documents} documents: {current_app.config['TFIDF_MODEL_PATH']}")
+    else:
+        click.echo("Not enough documents to fit the model")
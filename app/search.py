@@ -0,0 +1,101 @@
+import re
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from .models import db, Resume
+from .textstore import get_text_store, text_key
+
+# Column weights for bm25: a hit in the name counts most, one in the body text least
+SEARCH_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+def search_enabled():
+    """Whether the FTS5 search table is available (SQLite databases only)."""
+    return current_app.extensions.get('resume_search', False)
+
+def create_search_index(db):
+    """Create the FTS5 table behind the admin resume search, if the database supports it."""
+    engine = db.engine
+    enabled = False
+    if engine.dialect.name == 'sqlite':
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS resume_search "
+                    "USING fts5(name, email, skills, content, prefix='2 3')"
+                ))
+            enabled = True
+        except Exception as e:
+            current_app.logger.warning(f"Full-text search unavailable, falling back to LIKE: {str(e)}")
+    current_app.extensions['resume_search'] = enabled
+
+def index_resumes(resumes_with_text):
+    """Add or replace the search entries of resumes, in the caller's transaction."""
+    if not search_enabled():
+        return
+
+    for resume, content in resumes_with_text:
+        skills = ' '.join(resume.skills or [])
+        db.session.execute(text("DELETE FROM resume_search WHERE rowid = :id"), {'id': resume.id})
+        db.session.execute(
+            text("INSERT INTO resume_search (rowid, name, email, skills, content) "
+                 "VALUES (:id, :name, :email, :skills, :content)"),
+            {'id': resume.id, 'name': resume.name or '', 'email': resume.email or '',
+             'skills': skills, 'content': content or ''}
+        )
+
+def remove_from_index(resume_id):
+    """Drop the search entry of a deleted resume, in the caller's transaction."""
+    if search_enabled():
+        db.session.execute(text("DELETE FROM resume_search WHERE rowid = :id"), {'id': resume_id})
+
+def match_expression(q):
+    """Turn free text into an FTS5 query: every word must appear, as a word or a word prefix."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN.findall(q))
+
+def search_resumes(query, q):
+    """
+    Restrict a Resume query to resumes matching the search text, best matches first.
+    Uses the FTS5 table ranked by bm25, or LIKE over name, email and skills without it.
+    """
+    expression = match_expression(q)
+    if not expression:
+        return query
+
+    if not search_enabled():
+        pattern = f"%{q.strip()}%"
+        return query.filter(db.or_(Resume.name.ilike(pattern), Resume.email.ilike(pattern),
+                                   db.cast(Resume.skills, db.Text).ilike(pattern)))
+
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    matches = db.select(
+        db.literal_column('rowid').label('resume_id'),
+        db.literal_column(f'bm25(resume_search, {weights})').label('rank')
+    ).select_from(text('resume_search')) \
+        .where(text('resume_search MATCH :expression').bindparams(expression=expression)) \
+        .subquery()
+
+    # bm25 is lower for better matches
+    return query.join(matches, Resume.id == matches.c.resume_id).order_by(matches.c.rank)
+
+@click.command('rebuild-search-index')
+@click.option('--batch-size', default=500, help='Resumes per commit.')
+@with_appcontext
+def rebuild_search_index_command(batch_size):
+    """Index all processed resumes for the admin full-text search."""
+    if not search_enabled():
+        click.echo("Full-text search needs SQLite with FTS5")
+        return
+
+    store = get_text_store()
+    db.session.execute(text("DELETE FROM resume_search"))
+    resume_ids = [row.id for row in db.session.query(Resume.id).filter_by(status='processed').order_by(Resume.id)]
+    for start in range(0, len(resume_ids), batch_size):
+        resumes = Resume.query.filter(Resume.id.in_(resume_ids[start:start + batch_size])).all()
+        index_resumes([(resume, store.get(text_key(resume))) for resume in resumes])
+        db.session.commit()
+
+    click.echo(f"Indexed {len(resume_ids)} resumes")
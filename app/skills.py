@@ -0,0 +1,154 @@
+import threading
+from collections import deque
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from .models import db, Resume, Skill, resume_skills
+
+class SkillMatcher:
+    """
+    Aho-Corasick automaton over a skill taxonomy.
+    Finds every skill and synonym in a single pass over the text, and only
+    reports matches that start and end on word boundaries, so 'go' does not
+    match inside 'google' and 'java' does not match inside 'javascript'.
+    """
+
+    def __init__(self, synonyms):
+        # synonyms maps each lowercase pattern to its canonical skill name
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._size = 0
+
+        for pattern, skill in synonyms.items():
+            self._add(pattern, skill)
+        self._build_fail_links()
+
+    def __len__(self):
+        return self._size
+
+    def _add(self, pattern, skill):
+        """Add a pattern to the trie."""
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), skill))
+        self._size += 1
+
+    def _build_fail_links(self):
+        """Breadth-first pass linking each state to its longest proper suffix state."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # Inherit matches ending at the suffix state
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Return the canonical skills found in text, in order of first occurrence."""
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        length = len(text)
+        found = {}
+        state = 0
+
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for pattern_length, skill in output[state]:
+                start = end - pattern_length + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end + 1 < length and text[end + 1].isalnum():
+                    continue
+                found.setdefault(skill, start)
+
+        return list(found)
+
+def load_taxonomy(path):
+    """
+    Read a skill taxonomy file into a pattern -> canonical skill mapping.
+    Each line holds a canonical skill optionally followed by synonyms, all
+    separated by '|'. Blank lines and lines starting with '#' are ignored.
+    """
+    synonyms = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            names = [name.strip().lower() for name in line.split('|') if name.strip()]
+            for name in names:
+                synonyms.setdefault(name, names[0])
+    return synonyms
+
+# Matchers built in this process, keyed by taxonomy path
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+def get_skill_matcher(path=None):
+    """Return the skill matcher for a taxonomy file, building it once per process."""
+    path = path or current_app.config['SKILL_TAXONOMY_PATH']
+    matcher = _matchers.get(path)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(path)
+            if matcher is None:
+                matcher = SkillMatcher(load_taxonomy(path))
+                _matchers[path] = matcher
+    return matcher
+
+def normalize_skill(name):
+    """Form skill names are stored and looked up in."""
+    return ' '.join(name.lower().split())[:100]
+
+def get_or_create_skills(names):
+    """Return the Skill rows for a list of names, creating the missing ones."""
+    names = {normalize_skill(name) for name in names if name and name.strip()}
+    if not names:
+        return []
+
+    skills = {skill.name: skill for skill in Skill.query.filter(Skill.name.in_(names))}
+    for name in names - set(skills):
+        try:
+            # Another worker may add the same skill at the same time
+            with db.session.begin_nested():
+                skill = Skill(name=name)
+                db.session.add(skill)
+        except IntegrityError:
+            skill = Skill.query.filter_by(name=name).one()
+        skills[name] = skill
+    return list(skills.values())
+
+def set_resume_skills(resume, names):
+    """Replace the normalized skills of a resume."""
+    resume.skill_set = get_or_create_skills(names)
+
+def filter_by_skills(query, names):
+    """
+    Restrict a Resume query to resumes having all of the given skills.
+    Runs as a join on the resume_skills index instead of parsing the JSON column.
+    """
+    names = {normalize_skill(name) for name in names if name and name.strip()}
+    if not names:
+        return query
+
+    matching = db.session.query(resume_skills.c.resume_id) \
+        .join(Skill, Skill.id == resume_skills.c.skill_id) \
+        .filter(Skill.name.in_(names)) \
+        .group_by(resume_skills.c.resume_id) \
+        .having(db.func.count(resume_skills.c.skill_id) == len(names))
+    return query.filter(Resume.id.in_(matching))
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import db, Resume, Job, User
+
+# Models whose rows the cached counts are computed from
+COUNTED_MODELS = (Resume, Job, User)
+
+class StatsCache:
+    """
+    Aggregate counts for the admin pages, kept for STATS_CACHE_TTL seconds.
+    Commits that write resumes, jobs or users in this process clear it; other
+    processes' writes show up once the entry expires.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, ttl):
+        """Return the cached value of key, computing it when missing or expired."""
+        if not ttl:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            generation = self._generation
+        if cached and cached[0] > now:
+            return cached[1]
+
+        value = compute()
+        with self._lock:
+            # Not stored if a write committed while it was being computed
+            if generation == self._generation:
+                self._values[key] = (now + ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._generation += 1
+
+def get_stats_cache():
+    """Return the stats cache of the current app."""
+    app = current_app._get_current_object()
+    if 'stats_cache' not in app.extensions:
+        app.extensions['stats_cache'] = StatsCache()
+    return app.extensions['stats_cache']
+
+def _count_resumes():
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    # One grouped scan of resumes; job and user totals ride along as scalar subqueries
+    rows = db.session.execute(
+        db.select(
+            Resume.status,
+            db.func.count(Resume.id),
+            db.func.count(Resume.duplicate_of_id),
+            db.func.count(Resume.near_duplicate_of_id),
+            db.func.count(db.case((Resume.upload_date >= month_start, Resume.id))),
+            db.select(db.func.count(Job.id)).scalar_subquery(),
+            db.select(db.func.count(User.id)).scalar_subquery(),
+        ).group_by(Resume.status)
+    ).all()
+
+    stats = {'status': {}, 'resumes': 0, 'duplicates': 0, 'near_duplicates': 0, 'this_month': 0,
+             'jobs': None, 'users': None}
+    for status, count, duplicates, near_duplicates, this_month, jobs, users in rows:
+        stats['status'][status] = count
+        stats['resumes'] += count
+        stats['duplicates'] += duplicates
+        stats['near_duplicates'] += near_duplicates
+        stats['this_month'] += this_month
+        stats['jobs'], stats['users'] = jobs, users
+
+    if stats['jobs'] is None:
+        # No resumes, so no group carried the other totals
+        stats['jobs'] = Job.query.count()
+        stats['users'] = User.query.count()
+    return stats
+
+def resume_stats():
+    """
+    Counts shown on the admin pages: resumes per status, duplicates, near
+    duplicates, uploads this month and the job and user totals.
+    """
+    return get_stats_cache().get('resumes', _count_resumes, current_app.config['STATS_CACHE_TTL'])
+
+def _touches_counted_models(instances):
+    return any(isinstance(instance, COUNTED_MODELS) for instance in instances)
+
+@event.listens_for(Session, 'after_flush')
+def _mark_stats_dirty(session, flush_context):
+    if _touches_counted_models(list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['stats_dirty'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_write(orm_execute_state):
+    # Bulk query.update()/delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, COUNTED_MODELS):
+            orm_execute_state.session.info['stats_dirty'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _clear_stats(session):
+    if session.info.pop('stats_dirty', False) and has_app_context() and 'stats_cache' in current_app.extensions:
+        current_app.extensions['stats_cache'].clear()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stats_writes(session):
+    session.info.pop('stats_dirty', None)
@@ -0,0 +1,418 @@
+import atexit
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .models import db, Task, Resume
+
+# Registry of task kinds to handler functions, filled by @task_handler
+TASK_HANDLERS = {}
+
+# Task kinds the dispatcher queues periodically, mapped to the config key holding their interval
+SCHEDULED_TASKS = {}
+
+# Flask app created once per worker process by _init_worker
+_worker_app = None
+
+# Id of the task running in this thread, for report_progress
+_current = threading.local()
+
+class TaskSkipped(Exception):
+    """
+    Raised by a handler that had nothing to do yet. The task finishes as
+    'skipped', which does not count toward the schedule of its kind.
+    """
+
+def task_handler(kind):
+    """Register a function as the handler for a task kind."""
+    def decorator(func):
+        TASK_HANDLERS[kind] = func
+        return func
+    return decorator
+
+def scheduled(kind, interval_setting):
+    """Have the dispatcher queue a task of this kind every `interval_setting` seconds (0 disables it)."""
+    def decorator(func):
+        SCHEDULED_TASKS[kind] = interval_setting
+        return func
+    return decorator
+
+def enqueue_many(kind, payloads, wake=True):
+    """
+    Add one task per payload in a single commit and wake the worker pool.
+    With `wake=False` the tasks are left for an already running pool to pick up.
+    """
+    tasks = [Task(kind=kind, payload=json.dumps(payload)) for payload in payloads]
+    db.session.add_all(tasks)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    if app.config['WORKER_CONCURRENCY'] <= 0:
+        # No pool configured, run the tasks in the calling process
+        for task in tasks:
+            run_task(task.id)
+    elif wake and app.config['WORKER_AUTOSTART']:
+        get_worker_pool(app).wake()
+
+    return tasks
+
+def enqueue(kind, **payload):
+    """Add a task to the queue and wake the worker pool."""
+    return enqueue_many(kind, [payload])[0]
+
+def enqueue_unique(kind, wake=True, **payload):
+    """Queue a task unless one of the same kind is already waiting. Returns the new task or None."""
+    if Task.query.filter_by(kind=kind, status='queued').first():
+        return None
+    return enqueue_many(kind, [payload], wake=wake)[0]
+
+def enqueue_resume(resume_id):
+    """Queue a resume for text extraction and scoring."""
+    return enqueue('process_resume', resume_id=resume_id)
+
+def enqueue_resumes(resume_ids, force=False, wake=True):
+    """
+    Queue many resumes at once, split into batches of WORKER_BATCH_SIZE.
+    Each batch goes through the NLP pipeline together while workers share the batches.
+    """
+    resume_ids = list(resume_ids)
+    batch_size = current_app.config['WORKER_BATCH_SIZE']
+    payloads = [{'resume_ids': resume_ids[i:i + batch_size], 'force': force}
+                for i in range(0, len(resume_ids), batch_size)]
+    return enqueue_many('process_resumes', payloads, wake=wake)
+
+def claim_tasks(limit):
+    """Atomically mark up to `limit` queued tasks as running and return their ids."""
+    candidates = db.session.query(Task.id).filter_by(status='queued') \
+        .order_by(Task.id).limit(limit).all()
+
+    claimed = []
+    for (task_id,) in candidates:
+        # The status guard makes the claim safe across several dispatchers
+        now = datetime.utcnow()
+        updated = Task.query.filter_by(id=task_id, status='queued').update({
+            Task.status: 'running',
+            Task.started_at: now,
+            Task.heartbeat_at: now,
+            Task.attempts: Task.attempts + 1,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(task_id)
+    db.session.commit()
+    return claimed
+
+def finish_task(task_id, error=None, skipped=False):
+    """Record the outcome of a task."""
+    Task.query.filter_by(id=task_id).update({
+        Task.status: 'skipped' if skipped else 'failed' if error else 'done',
+        Task.error: error,
+        Task.finished_at: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+
+def report_progress(progress, total=None):
+    """Record how far the running task got, e.g. for a progress bar."""
+    task_id = getattr(_current, 'task_id', None)
+    if task_id is None:
+        return
+
+    values = {Task.progress: progress, Task.heartbeat_at: datetime.utcnow()}
+    if total is not None:
+        values[Task.total] = total
+    Task.query.filter_by(id=task_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+def heartbeat_tasks(task_ids):
+    """Mark running tasks as still alive, so other dispatchers don't take them for stale."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    Task.query.filter(Task.id.in_(task_ids), Task.status == 'running') \
+        .update({Task.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+def release_tasks(task_ids):
+    """Put claimed tasks that never reached a worker back in the queue, without counting the attempt."""
+    if not task_ids:
+        return
+    Task.query.filter(Task.id.in_(task_ids), Task.status == 'running').update({
+        Task.status: 'queued',
+        Task.started_at: None,
+        Task.heartbeat_at: None,
+        Task.attempts: Task.attempts - 1,
+    }, synchronize_session=False)
+    db.session.commit()
+
+def requeue_stale_tasks(max_age, max_attempts, exclude=()):
+    """
+    Put back running tasks without a heartbeat for `max_age` seconds, their
+    process having died, except the `exclude` ids still in progress here.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    stale = Task.query.filter(Task.status == 'running', db.func.coalesce(Task.heartbeat_at, Task.started_at) < cutoff)
+    if exclude:
+        stale = stale.filter(Task.id.notin_(list(exclude)))
+    return _requeue(stale, max_attempts)
+
+def requeue_tasks(task_ids, max_attempts):
+    """Put back running tasks whose worker process crashed."""
+    return _requeue(Task.query.filter(Task.id.in_(task_ids), Task.status == 'running'), max_attempts)
+
+def _requeue(running, max_attempts):
+    # Tasks out of attempts fail instead, so one that always kills its worker stops coming back
+    requeued = running.filter(Task.attempts < max_attempts) \
+        .update({Task.status: 'queued'}, synchronize_session=False)
+    running.update({Task.status: 'failed', Task.error: 'Worker did not finish the task'},
+                   synchronize_session=False)
+    db.session.commit()
+    return requeued
+
+def enqueue_scheduled_tasks():
+    """
+    Queue each scheduled task kind whose last task is older than its interval.
+    Skipped tasks don't count, so the kind is tried again after SCHEDULE_RETRY_INTERVAL.
+    """
+    now = datetime.utcnow()
+    retry_after = now - timedelta(seconds=current_app.config['SCHEDULE_RETRY_INTERVAL'])
+    payloads = {}
+    for kind, interval_setting in SCHEDULED_TASKS.items():
+        interval = current_app.config[interval_setting]
+        if interval <= 0:
+            continue
+        skipped = Task.status == 'skipped'
+        last_counted, last_skipped = db.session.query(
+            db.func.max(db.case((~skipped, Task.created_at))),
+            db.func.max(db.case((skipped, Task.created_at)))
+        ).filter(Task.kind == kind).one()
+        if last_counted is not None and last_counted >= now - timedelta(seconds=interval):
+            continue
+        if last_skipped is None or last_skipped < retry_after:
+            payloads[kind] = {}
+
+    # The dispatcher claims them on its next pass
+    for kind, payload in payloads.items():
+        enqueue_many(kind, [payload], wake=False)
+
+def run_task(task_id):
+    """Execute a claimed task in the current application context."""
+    task = db.session.get(Task, task_id)
+    if not task:
+        return
+
+    # Inline mode can run a task from inside another one
+    outer_task_id = getattr(_current, 'task_id', None)
+    _current.task_id = task_id
+    try:
+        handler = TASK_HANDLERS[task.kind]
+        handler(**json.loads(task.payload or '{}'))
+    except TaskSkipped as e:
+        db.session.rollback()
+        current_app.logger.info(f"Task {task_id} ({task.kind}) skipped: {str(e)}")
+        finish_task(task_id, error=str(e), skipped=True)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Task {task_id} ({task.kind}) failed: {str(e)}")
+        finish_task(task_id, error=str(e))
+    else:
+        finish_task(task_id)
+    finally:
+        _current.task_id = outer_task_id
+
+def in_worker_process():
+    """True inside a process of the worker pool."""
+    return _worker_app is not None
+
+def _init_worker():
+    """Create the Flask app once in each pool process."""
+    global _worker_app
+    from . import create_app
+    _worker_app = create_app()
+
+def _run_task_in_worker(task_id):
+    """Entry point for tasks submitted to the process pool."""
+    with _worker_app.app_context():
+        run_task(task_id)
+
+class WorkerPool:
+    """Dispatches queued tasks to a local process pool."""
+
+    # Seconds between checks for tasks left running by a dead worker
+    STALE_CHECK_INTERVAL = 60
+
+    # Seconds between heartbeats of the tasks this pool is running, well under WORKER_STALE_AFTER
+    HEARTBEAT_INTERVAL = 30
+
+    def __init__(self, app, concurrency=None):
+        self.app = app
+        self.concurrency = concurrency or app.config['WORKER_CONCURRENCY']
+        self.poll_interval = app.config['WORKER_POLL_INTERVAL']
+        self._executor = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._inflight = {}
+        self._broken = False
+        self._next_stale_check = 0
+        self._next_heartbeat = 0
+
+    def start(self):
+        """Start the dispatcher thread if it is not running yet."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name='resume-worker-dispatcher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def wake(self):
+        """Start the pool if needed and check the queue right away."""
+        self.start()
+        self._wakeup.set()
+
+    def stop(self):
+        """Stop dispatching and wait for running tasks to finish."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def run(self):
+        """Dispatcher loop: claim tasks while there are free worker slots."""
+        if self._executor is None:
+            self._executor = self._new_executor()
+
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                claimed = []
+                try:
+                    self._reap()
+                    if self._broken:
+                        self._restart_executor()
+                    self._heartbeat()
+                    self._requeue_stale()
+                    enqueue_scheduled_tasks()
+                    free = self.concurrency - len(self._inflight)
+                    if free > 0:
+                        claimed = claim_tasks(free)
+                        while claimed:
+                            future = self._executor.submit(_run_task_in_worker, claimed[0])
+                            # A finished task frees a slot, so look at the queue again
+                            future.add_done_callback(lambda f: self._wakeup.set())
+                            self._inflight[future] = claimed.pop(0)
+                except BrokenProcessPool as e:
+                    # A worker process died (out of memory, a crash in a PDF parser); the executor is unusable
+                    self.app.logger.error(f"Worker process died, restarting the pool: {str(e)}")
+                    self._release(claimed)
+                    self._restart_executor()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Worker dispatcher error: {str(e)}")
+                    self._release(claimed)
+                finally:
+                    db.session.remove()
+
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _new_executor(self):
+        # Spawn keeps the children free of the parent's threads and DB connections
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def _release(self, task_ids):
+        """Return claimed tasks that were never submitted to the queue."""
+        try:
+            release_tasks(task_ids)
+        except Exception as e:
+            # Left running, the stale check requeues them later
+            db.session.rollback()
+            self.app.logger.error(f"Could not requeue tasks {task_ids}: {str(e)}")
+
+    def _restart_executor(self):
+        """Replace a broken executor; its in-flight futures fail and are requeued by _reap."""
+        self._executor.shutdown(wait=False)
+        self._executor = self._new_executor()
+        self._broken = False
+
+    def _heartbeat(self):
+        """Every HEARTBEAT_INTERVAL seconds, show the dispatchers of other processes that our tasks are alive."""
+        now = time.monotonic()
+        if now < self._next_heartbeat:
+            return
+        self._next_heartbeat = now + self.HEARTBEAT_INTERVAL
+        heartbeat_tasks(self._inflight.values())
+
+    def _requeue_stale(self):
+        """Every STALE_CHECK_INTERVAL seconds, requeue tasks left running by a worker that died elsewhere."""
+        now = time.monotonic()
+        if now < self._next_stale_check:
+            return
+        self._next_stale_check = now + self.STALE_CHECK_INTERVAL
+        requeue_stale_tasks(self.app.config['WORKER_STALE_AFTER'], self.app.config['WORKER_MAX_ATTEMPTS'],
+                            exclude=self._inflight.values())
+
+    def _reap(self):
+        """Drop finished futures, fail tasks that raised and requeue those a dying process took down."""
+        crashed = []
+        for future in [f for f in self._inflight if f.done()]:
+            task_id = self._inflight.pop(future)
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                crashed.append(task_id)
+            elif error:
+                finish_task(task_id, error=f"Worker process failed: {str(error)}")
+
+        if crashed:
+            self._broken = True
+            # Any of these tasks may have killed the process; the attempt limit stops one that always does
+            requeue_tasks(crashed, self.app.config['WORKER_MAX_ATTEMPTS'])
+
+def get_worker_pool(app):
+    """Return the worker pool attached to the app, creating it on first use."""
+    if 'worker_pool' not in app.extensions:
+        app.extensions['worker_pool'] = WorkerPool(app)
+    return app.extensions['worker_pool']
+
+@click.command('worker')
+@click.option('--concurrency', type=int, help='Number of worker processes.')
+@with_appcontext
+def worker_command(concurrency):
+    """Run the background worker pool in the foreground."""
+    app = current_app._get_current_object()
+    pool = WorkerPool(app, concurrency)
+    click.echo(f"Starting worker pool with {pool.concurrency} processes")
+    try:
+        pool.run()
+    except KeyboardInterrupt:
+        pool.stop()
+
+@click.command('reprocess')
+@click.option('--job-id', type=int, help='Only resumes submitted for this job.')
+@click.option('--status', help='Only resumes with this status, e.g. error.')
+@click.option('--force', is_flag=True, help='Parse the original files again.')
+@with_appcontext
+def reprocess_command(job_id, status, force):
+    """Queue existing resumes for processing again."""
+    query = db.session.query(Resume.id)
+    if job_id:
+        query = query.filter(Resume.job_id == job_id)
+    if status:
+        query = query.filter(Resume.status == status)
+    resume_ids = [row.id for row in query.order_by(Resume.id)]
+
+    Resume.query.filter(Resume.id.in_(resume_ids)).update({Resume.status: 'pending'}, synchronize_session=False)
+    db.session.commit()
+    # The command exits right away, so leave the tasks to the web or `flask worker` pool
+    tasks = enqueue_resumes(resume_ids, force=force, wake=False)
+    click.echo(f"Queued {len(resume_ids)} resumes in {len(tasks)} tasks")
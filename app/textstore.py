@@ -0,0 +1,51 @@
+import os
+import zlib
+from flask import current_app
+
+class TextStore:
+    """Compressed on-disk store for the text extracted from resume files."""
+
+    def __init__(self, root, compression_level=6):
+        self.root = root
+        self.compression_level = compression_level
+
+    def _path(self, key):
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.root, key[:2], f"{key}.txt.z")
+
+    def get(self, key):
+        """Return the stored text for a key, or None if it was never stored."""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        """Store text under a key, replacing any previous version."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(text.encode('utf-8'), self.compression_level))
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        """Remove the text stored under a key."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+def text_key(resume):
+    """Store key of a resume: its file hash, so identical files share one entry."""
+    return resume.file_hash or f"resume-{resume.id}"
+
+def get_text_store():
+    """Return the text store of the current app."""
+    app = current_app._get_current_object()
+    if 'text_store' not in app.extensions:
+        app.extensions['text_store'] = TextStore(app.config['TEXT_STORE_FOLDER'])
+    return app.extensions['text_store']
@@ -1,41 +1,238 @@
+import atexit
 import os
 import re
 import json
+import time
+import hashlib
+import threading
+import multiprocessing
+import uuid
+import zipfile
+from datetime import datetime
+from collections import OrderedDict, namedtuple
 import PyPDF2
 from docx import Document
 from flask import current_app
+from werkzeug.utils import secure_filename
 from .models import db, Resume, Job
-import spacy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
-
-# Load English language model for spaCy
-try:
-    nlp = spacy.load('en_core_web_sm')
-except OSError:
-    # If the model is not found, download it
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
-    nlp = spacy.load('en_core_web_sm')
+from .packed import unpack
+from .tasks import task_handler, report_progress, in_worker_process, enqueue_unique
+from .textstore import get_text_store, text_key
+from .skills import get_skill_matcher, set_resume_skills
+from .minhash import get_lsh_index, index_near_duplicates
+from .vectorstore import get_vector_store
+from .search import index_resumes, remove_from_index
+from .scoring import get_vectorizer, model_stamp, similarity, similarities, job_text
+
+# spaCy pipeline, loaded on first use by get_nlp()
+_nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+def get_nlp():
+    """
+    Load the English spaCy model once per process.
+    NER and the lemmatizer are excluded since skill extraction only needs noun chunks.
+    Returns None when the model is not installed.
+    """
+    global _nlp, _nlp_loaded
+    if not _nlp_loaded:
+        with _nlp_lock:
+            if not _nlp_loaded:
+                import spacy
+                try:
+                    _nlp = spacy.load('en_core_web_sm', exclude=['ner', 'lemmatizer'])
+                except OSError:
+                    current_app.logger.warning(
+                        "spaCy model 'en_core_web_sm' is not installed, skills are matched by keyword only. "
+                        "Run: python -m spacy download en_core_web_sm"
+                    )
+                _nlp_loaded = True
+    return _nlp
 
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in {'pdf', 'docx'}
 
-def extract_text_from_pdf(file_path):
-    """Extract text content from a PDF file."""
-    text = ""
+def save_resume_file(stream, filename):
+    """
+    Copy an uploaded file stream into the upload folder in fixed-size chunks.
+    Returns the unique filename, its path and the SHA-256 of the content.
+    """
+    filename = secure_filename(filename)
+    unique_filename = f"{uuid.uuid4().hex}_{filename}"
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    file_hash = hashlib.sha256()
+    
     try:
+        with open(filepath, 'wb') as out:
+            # Hash while copying so the file is only read once
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                file_hash.update(chunk)
+                out.write(chunk)
+    except Exception:
+        # Don't leave half-written files behind
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+    
+    return unique_filename, filepath, file_hash.hexdigest()
+
+def iter_uploaded_resumes(files):
+    """
+    Yield (filename, stream, error) for each resume in a list of uploads.
+    ZIP archives are read one entry at a time, so only the entry being
+    copied is ever decompressed.
+    """
+    max_size = current_app.config['BULK_MAX_ENTRY_SIZE']
+    
+    for upload in files:
+        filename = os.path.basename(upload.filename or '')
+        if not filename:
+            continue
+        
+        if not filename.lower().endswith('.zip'):
+            yield filename, upload.stream, None if allowed_file(filename) else 'Unsupported file type'
+            continue
+        
+        try:
+            archive = zipfile.ZipFile(upload.stream)
+        except zipfile.BadZipFile:
+            yield filename, None, 'Not a valid ZIP archive'
+            continue
+        
+        with archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                    continue
+                if not allowed_file(name):
+                    yield name, None, 'Unsupported file type'
+                elif info.file_size > max_size:
+                    yield name, None, 'File too large'
+                else:
+                    with archive.open(info) as entry:
+                        yield name, entry, None
+
+# Processes reading PDFs, created on first use and killed when a page overruns the time budget
+_pdf_pool = None
+_pdf_pool_size = 0
+
+# Seconds a PDF process gets past the budget to return what it extracted before it is killed
+PDF_KILL_GRACE = 2
+
+def _get_pdf_pool(processes):
+    """
+    Return the process pool PDFs are read in. A page stuck in the parser
+    can then be stopped by terminating the pool.
+    """
+    global _pdf_pool, _pdf_pool_size
+    if _pdf_pool is None or _pdf_pool_size != processes:
+        _close_pdf_pool()
+        _pdf_pool = multiprocessing.get_context('spawn').Pool(processes)
+        _pdf_pool_size = processes
+    return _pdf_pool
+
+def _close_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.terminate()
+        _pdf_pool.join()
+        _pdf_pool = None
+
+atexit.register(_close_pdf_pool)
+
+def extract_pdf_pages(file_path, start, stop, deadline=None, max_chars=None, reader=None):
+    """
+    Extract the text of pages [start, stop) of a PDF as a list of strings.
+    Stops early once the wall-clock `deadline` passes or `max_chars` are collected.
+    """
+    if reader is None:
         with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                text += page.extract_text() + "\n"
+            return extract_pdf_pages(file_path, start, stop, deadline, max_chars, PyPDF2.PdfReader(file))
+
+    parts = []
+    total_chars = 0
+    for page_num in range(start, stop):
+        if deadline and time.time() > deadline:
+            break
+        page_text = reader.pages[page_num].extract_text() or ''
+        parts.append(page_text)
+        total_chars += len(page_text)
+        if max_chars and total_chars >= max_chars:
+            break
+    return parts
+
+def read_pdf(file_path, max_pages, deadline=None, max_chars=None, split_from=None):
+    """
+    Count the pages of a PDF and extract the first `max_pages` with the same reader.
+    Returns (total pages, page texts); the texts are None when the document
+    has at least `split_from` pages and is left to be split into ranges.
+    """
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        total_pages = len(reader.pages)
+        num_pages = min(total_pages, max_pages)
+        if split_from and num_pages >= split_from:
+            return total_pages, None
+        return total_pages, extract_pdf_pages(file_path, 0, num_pages, deadline, max_chars, reader)
+
+def extract_text_from_pdf(file_path):
+    """
+    Extract text content from a PDF file.
+    Page count, text length and time are bounded by the PDF_* settings; the
+    PDF is read in a separate process that is killed once it overruns the
+    time budget. When tasks run inline, long documents are split into page
+    ranges extracted in parallel; a pool worker reads them in one process.
+    """
+    config = current_app.config
+    max_pages = config['PDF_MAX_PAGES']
+    max_chars = config['PDF_MAX_CHARS']
+    started = time.time()
+    deadline = started + config['PDF_TIME_BUDGET']
+    parts = []
+    
+    workers = config['PDF_PARALLEL_WORKERS']
+    # A pool of pools would start WORKER_CONCURRENCY * PDF_PARALLEL_WORKERS processes
+    parallel = workers > 1 and config['WORKER_CONCURRENCY'] <= 0 and not in_worker_process()
+    pool = _get_pdf_pool(workers if parallel else 1)
+    try:
+        result = pool.apply_async(read_pdf, (file_path, max_pages, deadline, max_chars,
+                                             config['PDF_PARALLEL_MIN_PAGES'] if parallel else None))
+        total_pages, parts = result.get(timeout=max(deadline - time.time(), 0) + PDF_KILL_GRACE)
+        num_pages = min(total_pages, max_pages)
+        if total_pages > max_pages:
+            current_app.logger.warning(f"PDF {os.path.basename(file_path)} has {total_pages} pages, extracting the first {max_pages}")
+        
+        if parts is None:
+            # One contiguous page range per worker keeps the output in page order
+            parts = []
+            chunk = -(-num_pages // workers)
+            results = [pool.apply_async(extract_pdf_pages, (file_path, start, min(start + chunk, num_pages), deadline, max_chars))
+                       for start in range(0, num_pages, chunk)]
+            for result in results:
+                parts.extend(result.get(timeout=max(deadline - time.time(), 0) + PDF_KILL_GRACE))
+    except multiprocessing.TimeoutError:
+        # A page is stuck in the parser: kill it and keep the ranges extracted so far
+        current_app.logger.warning(f"Stopped reading PDF {os.path.basename(file_path)} past its time budget")
+        _close_pdf_pool()
     except Exception as e:
         current_app.logger.error(f"Error extracting text from PDF: {str(e)}")
+    
+    # Join once instead of growing a string page by page
+    text = "\n".join(parts or [])
+    if len(text) > max_chars:
+        text = text[:max_chars]
+    
+    elapsed = time.time() - started
+    if time.time() > deadline:
+        current_app.logger.warning(f"PDF {os.path.basename(file_path)} hit the {config['PDF_TIME_BUDGET']}s time budget")
+    current_app.logger.info(
+        f"Extracted {len(parts or [])} pages from {os.path.basename(file_path)} in {elapsed:.2f}s "
+        f"({len(parts or []) / elapsed if elapsed else 0:.1f} pages/sec)"
+    )
     return text
 
 def extract_text_from_docx(file_path):
@@ -47,27 +244,16 @@ def extract_text_from_docx(file_path):
         current_app.logger.error(f"Error extracting text from DOCX: {str(e)}")
         return ""
 
-def extract_skills(text):
-    """Extract skills from text using NLP."""
-    # List of common skills (can be expanded)
-    common_skills = [
-        'python', 'javascript', 'java', 'c++', 'c#', 'ruby', 'php', 'swift', 'kotlin', 'go',
-        'django', 'flask', 'react', 'angular', 'vue', 'node.js', 'express', 'spring', 'laravel',
-        'sql', 'mysql', 'postgresql', 'mongodb', 'redis', 'oracle', 'sql server',
-        'aws', 'azure', 'google cloud', 'docker', 'kubernetes', 'jenkins', 'git', 'ci/cd',
-        'machine learning', 'deep learning', 'data analysis', 'data visualization', 'nlp',
-        'agile', 'scrum', 'devops', 'rest api', 'graphql', 'microservices', 'tensorflow', 'pytorch'
-    ]
-    
-    # Convert to lowercase for case-insensitive matching
-    text_lower = text.lower()
-    
-    # Find skills in the text
-    found_skills = [skill for skill in common_skills if skill in text_lower]
+def extract_skills(text, doc=None):
+    """Extract skills from text using NLP. Pass `doc` to reuse an already parsed spaCy document."""
+    # Match the skill taxonomy in a single pass over the text
+    found_skills = get_skill_matcher().find(text)
     
     # Use spaCy to find noun phrases that might be skills
-    doc = nlp(text)
-    noun_phrases = set(chunk.text.lower() for chunk in doc.noun_chunks)
+    if doc is None:
+        nlp = get_nlp()
+        doc = nlp(text) if nlp else None
+    noun_phrases = set(chunk.text.lower() for chunk in doc.noun_chunks) if doc else set()
     
     # Add any noun phrases that are not too long and not already in found_skills
     for phrase in noun_phrases:
@@ -76,227 +262,504 @@ def extract_skills(text):
     
     return list(set(found_skills))  # Remove duplicates
 
-def extract_experience(text):
-    """Extract work experience information."""
-    # This is a simplified version - consider using a more sophisticated approach
-    experience = {}
-    
-    # Look for dates that might indicate work periods
-    date_pattern = r'(\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4})\s*-\s*((?:(?:Present|Current)|(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4})?)'
+# Month names used in experience date ranges
+_MONTH = r'(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)'
+_SCHOOL = r'\b(?:University|College|Institute|School|Academy)\b'
+
+# One alternation with a named group per kind of detail, so a resume is scanned once.
+# Alternatives are tried in order at each position.
+RESUME_DETAILS_PATTERN = re.compile(
+    # Work period, e.g. "Jan 2020 - Present"
+    rf'(?P<date_range>(?i:\b(?P<start_date>{_MONTH}\s+\d{{4}})\s*-\s*(?P<end_date>Present|Current|{_MONTH}\s+\d{{4}})?))'
+    # Degrees: upper-case abbreviations, or spelled out in any case
+    r"|(?P<degree>\b(?:B\.?S|B\.?A|B\.?E|M\.?S|M\.?A|M\.?E|Ph\.?D)\.?(?!\w)"
+    r"|(?i:\b(?:Bachelor|Master)(?:'?s)?(?:\s+of\s+(?:Science|Arts|Engineering))?(?:\s+in\s+\w+)?\b)"
+    r"|(?i:\bDoctor(?:ate)?(?:\s+of\s+Philosophy)?(?:\s+in\s+\w+)?\b))"
+    r'|(?P<email>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)'
+    r'|(?P<phone>(?:\+\d{1,3}[-.\s]?)?\(?\b\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b)'
+    # School names take the capitalized words before the keyword ("Stanford University") and
+    # run to the end of the line or the next delimiter, so a degree, email or phone later
+    # on the same line is still matched
+    rf"|(?P<school>\b(?:[A-Z][\w.&']*[ \t]+)*(?i:{_SCHOOL})[^\n,;|-]*)"
+    # Job titles: a line made only of capitalized words that is not a school
+    rf'|(?m:^[ \t]*(?!.*(?i:{_SCHOOL}))(?P<title>[A-Z][a-z]+(?:[ \t]+[A-Z][a-z]+)*)[ \t]*$)'
+)
+
+def scan_resume_text(text):
+    """
+    Scan text once and collect every date range, job title, degree, school,
+    email and phone number, in order of appearance.
+    """
+    details = {'date_ranges': [], 'titles': [], 'degrees': [], 'schools': [], 'emails': [], 'phones': []}
     
-    # Look for job titles (this is very basic and may need refinement)
-    title_pattern = r'(?:\n|^)\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s*(?:\n|$)'
+    for match in RESUME_DETAILS_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'date_range':
+            details['date_ranges'].append({
+                'start_date': match.group('start_date'),
+                'end_date': match.group('end_date') or 'Present',
+            })
+        elif kind == 'title':
+            title = match.group('title')
+            if len(title.split()) <= 4:  # Limit title length
+                details['titles'].append(title)
+        elif kind == 'degree':
+            details['degrees'].append(match.group(0))
+        elif kind == 'school':
+            details['schools'].append(match.group(0).strip())
+        elif kind == 'email':
+            details['emails'].append(match.group(0))
+        elif kind == 'phone':
+            details['phones'].append(match.group(0).strip())
     
-    # Find all matches
-    date_matches = re.finditer(date_pattern, text, re.IGNORECASE)
-    title_matches = re.finditer(title_pattern, text)
+    return details
+
+def extract_details(text):
+    """Build the experience, education and contact dictionaries from a single scan of the text."""
+    details = scan_resume_text(text)
+    experience, education, contact = {}, {}, {}
     
-    # Extract dates and titles (this is a simplified approach)
-    dates = [match.group(0).strip() for match in date_matches]
-    titles = [match.group(1).strip() for match in title_matches if len(match.group(1).split()) <= 4]  # Limit title length
+    if details['date_ranges']:
+        experience['start_date'] = details['date_ranges'][0]['start_date']
+        experience['end_date'] = details['date_ranges'][0]['end_date']
+        experience['date_ranges'] = details['date_ranges']
+    if details['titles']:
+        experience['most_recent_title'] = details['titles'][0]
     
-    # Create a simple experience dictionary
-    if dates:
-        experience['start_date'] = dates[0].split('-')[0].strip()
-        experience['end_date'] = dates[0].split('-')[1].strip() if len(dates) > 0 and '-' in dates[0] else 'Present'
+    # Remove duplicates, keeping the order of appearance
+    if details['degrees']:
+        education['degrees'] = list(dict.fromkeys(details['degrees']))
+    if details['schools']:
+        education['schools'] = list(dict.fromkeys(details['schools']))
     
-    if titles:
-        experience['most_recent_title'] = titles[0]
+    if details['emails']:
+        contact['email'] = details['emails'][0]  # Take the first email found
+    if details['phones']:
+        contact['phone'] = details['phones'][0]
     
-    return experience
+    return experience, education, contact
+
+def extract_experience(text):
+    """Extract work experience information."""
+    return extract_details(text)[0]
 
 def extract_education(text):
     """Extract education information."""
-    education = {}
-    
-    # Look for degree patterns
-    degree_patterns = [
-        r'\b(?:B\.?S\.?|Bachelor(?:\'?s)?(?:\s+of\s+Science)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:M\.?S\.?|Master(?:\'?s)?(?:\s+of\s+Science)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:Ph\.?D\.?|Doctor(?:ate)?(?:\s+of\s+Philosophy)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:B\.?A\.?|Bachelor(?:\'?s)?(?:\s+of\s+Arts)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:M\.?A\.?|Master(?:\'?s)?(?:\s+of\s+Arts)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:B\.?E\.?|Bachelor(?:\'?s)?(?:\s+of\s+Engineering)?(?:\s+in\s+\w+)?)\b',
-        r'\b(?:M\.?E\.?|Master(?:\'?s)?(?:\s+of\s+Engineering)?(?:\s+in\s+\w+)?)\b',
-    ]
-    
-    # Look for university/school names (simplified)
-    school_pattern = r'\b(?:University|College|Institute|School|Academy)\b.*?\n'
-    
-    # Find all matches
-    degrees = []
-    for pattern in degree_patterns:
-        degrees.extend([match.group(0) for match in re.finditer(pattern, text, re.IGNORECASE)])
-    
-    schools = [match.group(0).strip() for match in re.finditer(school_pattern, text, re.IGNORECASE)]
-    
-    # Create education dictionary
-    if degrees:
-        education['degrees'] = list(set(degrees))  # Remove duplicates
-    
-    if schools:
-        education['schools'] = list(set(schools))  # Remove duplicates
-    
-    return education
+    return extract_details(text)[1]
 
 def extract_contact_info(text):
     """Extract contact information from text."""
-    contact = {}
-    
-    # Email pattern
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    emails = re.findall(email_pattern, text)
-    if emails:
-        contact['email'] = emails[0]  # Take the first email found
+    return extract_details(text)[2]
+
+def extract_resume_batch(texts, batch_size=None, n_process=None):
+    """
+    Extract skills, experience, education and contact information from many texts.
+    The texts are streamed through nlp.pipe in batches instead of parsed one by one.
+    Returns one dict per text, in order.
+    """
+    texts = list(texts)
+    batch_size = batch_size or current_app.config['NLP_BATCH_SIZE']
+    n_process = n_process or current_app.config['NLP_N_PROCESS']
     
-    # Phone number pattern (simplified)
-    phone_pattern = r'(\+\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
-    phones = re.findall(phone_pattern, text)
-    if phones:
-        contact['phone'] = phones[0].strip()
+    nlp = get_nlp()
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process) if nlp else [None] * len(texts)
     
-    return contact
+    results = []
+    for text, doc in zip(texts, docs):
+        experience, education, contact = extract_details(text)
+        results.append({
+            'skills': extract_skills(text, doc=doc),
+            'experience': experience,
+            'education': education,
+            'contact': contact,
+        })
+    return results
 
 def calculate_similarity(resume_text, job_description):
-    """Calculate similarity score between resume and job description using TF-IDF."""
+    """
+    Calculate similarity score between resume and job description using TF-IDF.
+    Uses the corpus model when one was fitted, otherwise fits the pair alone.
+    """
     if not resume_text or not job_description:
         return 0.0
     
-    # Create TF-IDF vectorizer
-    vectorizer = TfidfVectorizer(stop_words='english')
-    
     try:
-        # Fit and transform the texts
-        tfidf_matrix = vectorizer.fit_transform([resume_text, job_description])
+        vectorizer = get_vectorizer()
+        if vectorizer is not None:
+            return similarity(vectorizer, resume_text, job_description)
+        
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics.pairwise import cosine_similarity
         
-        # Calculate cosine similarity
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
+        # No corpus model yet: IDF over just these two documents
+        vectorizer = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = vectorizer.fit_transform([resume_text, job_description])
+        similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
         
         # Convert to percentage (0-100)
-        return round(float(similarity[0][0]) * 100, 2)
+        return round(float(similarity_matrix[0][0]) * 100, 2)
     except Exception as e:
         current_app.logger.error(f"Error calculating similarity: {str(e)}")
         return 0.0
 
-def process_resume(resume_id):
-    """Process a resume asynchronously to extract information and calculate scores."""
-    with current_app.app_context():
+def extract_text(file_path):
+    """Extract text from a resume file based on its extension."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    
+    if file_ext == '.pdf':
+        return extract_text_from_pdf(file_path)
+    elif file_ext == '.docx':
+        return extract_text_from_docx(file_path)
+    else:
+        raise ValueError(f"Unsupported file format: {file_ext}")
+
+def get_resume_text(resume, refresh=False):
+    """
+    Return the extracted text of a resume from the text store, parsing the
+    original file only when the text was never stored or `refresh` is set.
+    """
+    store = get_text_store()
+    key = text_key(resume)
+    
+    text = None if refresh else store.get(key)
+    if text is None:
+        text = extract_text(resume.file_path)
+        store.put(key, text)
+    
+    return text
+
+def find_processed_duplicate(resume):
+    """Return the earliest processed resume uploaded before this one with the same file content."""
+    if not resume.file_hash:
+        return None
+    
+    # Only look at older uploads so the original never copies from its duplicates
+    return Resume.query.filter(
+        Resume.file_hash == resume.file_hash,
+        Resume.status == 'processed',
+        Resume.id < resume.id
+    ).order_by(Resume.id).first()
+
+# Keywords and TF-IDF vector of a job at one version
+JobProfile = namedtuple('JobProfile', ['version', 'keywords', 'vectorizer', 'vector'])
+
+class JobProfileCache:
+    """
+    LRU cache of job profiles, so each job description goes through the NLP
+    pipeline once per version instead of once per resume.
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, job):
+        """Return the profile of a job, recomputing it after an edit or a model refit."""
+        vectorizer = get_vectorizer()
+        with self._lock:
+            profile = self._profiles.get(job.id)
+            if profile is not None:
+                self._profiles.move_to_end(job.id)
+        
+        if profile is None or profile.version != job.version:
+            profile = JobProfile(job.version, extract_skills(job_text(job)), None, None)
+        if profile.vectorizer is not vectorizer:
+            vector = vectorizer.transform([job_text(job)]) if vectorizer is not None else None
+            profile = profile._replace(vectorizer=vectorizer, vector=vector)
+        
+        with self._lock:
+            self._profiles[job.id] = profile
+            self._profiles.move_to_end(job.id)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+        return profile
+
+def get_job_profile(job):
+    """Return the cached keywords and vector of a job."""
+    app = current_app._get_current_object()
+    if 'job_profiles' not in app.extensions:
+        app.extensions['job_profiles'] = JobProfileCache(app.config['JOB_CACHE_SIZE'])
+    return app.extensions['job_profiles'].get(job)
+
+def score_texts(job, texts):
+    """Score many resume texts against a job, in a single transform when a corpus model exists."""
+    profile = get_job_profile(job)
+    if profile.vector is None:
+        return [calculate_similarity(text, job_text(job)) for text in texts]
+    
+    try:
+        return similarities(profile.vectorizer, [text or '' for text in texts], profile.vector)
+    except Exception as e:
+        current_app.logger.error(f"Error calculating similarity: {str(e)}")
+        return [0.0] * len(texts)
+
+def score_resume(resume, text, skills):
+    """Calculate the match score and matched/missing keywords against the resume's job."""
+    job = db.session.get(Job, resume.job_id) if resume.job_id else None
+    if not job:
+        return
+    
+    resume.score = score_texts(job, [text])[0]
+    resume.score_stale = False
+    match_keywords(resume, skills, get_job_profile(job).keywords)
+
+def match_keywords(resume, skills, job_keywords):
+    """Store the job keywords a resume's skills match and miss."""
+    matched_keywords = [skill for skill in skills if skill in job_keywords]
+    missing_keywords = [skill for skill in job_keywords if skill not in skills]
+    
+    resume.matched_keywords = matched_keywords or None
+    resume.missing_keywords = missing_keywords or None
+
+def copy_extracted_fields(resume, source):
+    """Reuse the extraction results of a resume with identical file content."""
+    resume.duplicate_of_id = source.duplicate_of_id or source.id
+    resume.near_duplicate_of_id = source.near_duplicate_of_id
+    resume.minhash = source.minhash
+    resume.name = resume.name or source.name
+    resume.email = source.email
+    resume.phone = source.phone
+    # Packed values are copied as stored, without decoding them
+    resume._skills = source._skills
+    resume.skill_set = list(source.skill_set)
+    resume._experience = source._experience
+    resume._education = source._education
+    
+    if source.job_id == resume.job_id:
+        # Same content against the same job gives the same score
+        resume.score = source.score
+        resume.score_stale = source.score_stale
+        resume._matched_keywords = source._matched_keywords
+        resume._missing_keywords = source._missing_keywords
+    elif resume.job_id:
+        score_resume(resume, get_resume_text(resume), source.skills or [])
+
+def apply_extracted_fields(resume, extracted):
+    """Store the output of extract_resume_batch on a resume."""
+    contact = extracted['contact']
+    
+    # Update resume with extracted information
+    if 'email' in contact:
+        resume.email = contact['email']
+    if 'phone' in contact:
+        resume.phone = contact['phone']
+    
+    # If name not provided, try to extract from filename
+    if not resume.name:
+        # Simple heuristic: take the first part of the filename as name
+        name_parts = os.path.splitext(resume.original_filename)[0].split('_')
+        if name_parts:
+            resume.name = ' '.join(part.capitalize() for part in name_parts[0].split())
+    
+    # Store extracted data, packed when the row is written
+    resume.skills = extracted['skills'] or None
+    set_resume_skills(resume, extracted['skills'])
+    resume.experience = extracted['experience'] or None
+    resume.education = extracted['education'] or None
+
+@task_handler('process_resumes')
+def process_resumes(resume_ids, force=False):
+    """
+    Process a batch of resumes in a background worker to extract information and calculate scores.
+    All texts of the batch go through the NLP pipeline together.
+    With `force`, files are parsed again instead of reusing stored or duplicate results.
+    """
+    resumes = Resume.query.filter(Resume.id.in_(resume_ids)).order_by(Resume.id).all()
+    if not resumes:
+        return
+    
+    # Update status to processing
+    for resume in resumes:
+        resume.status = 'processing'
+    db.session.commit()
+    
+    to_extract = []
+    for resume in resumes:
         try:
-            resume = Resume.query.get(resume_id)
-            if not resume:
-                return
-            
-            # Update status to processing
-            resume.status = 'processing'
-            db.session.commit()
-            
-            # Extract text based on file type
-            file_ext = os.path.splitext(resume.file_path)[1].lower()
-            
-            if file_ext == '.pdf':
-                text = extract_text_from_pdf(resume.file_path)
-            elif file_ext == '.docx':
-                text = extract_text_from_docx(resume.file_path)
+            # Identical files were already extracted, only the job score may differ
+            source = None if force else find_processed_duplicate(resume)
+            if source:
+                copy_extracted_fields(resume, source)
+                resume.status = 'processed'
             else:
-                raise ValueError(f"Unsupported file format: {file_ext}")
-            
-            # Extract information
-            contact = extract_contact_info(text)
-            skills = extract_skills(text)
-            experience = extract_experience(text)
-            education = extract_education(text)
-            
-            # Update resume with extracted information
-            if 'email' in contact:
-                resume.email = contact['email']
-            if 'phone' in contact:
-                resume.phone = contact['phone']
-            
-            # If name not provided, try to extract from filename
-            if not resume.name:
-                # Simple heuristic: take the first part of the filename as name
-                name_parts = os.path.splitext(resume.original_filename)[0].split('_')
-                if name_parts:
-                    resume.name = ' '.join(part.capitalize() for part in name_parts[0].split())
-            
-            # Store extracted data as JSON strings
-            resume.skills = json.dumps(skills) if skills else None
-            resume.experience = json.dumps(experience) if experience else None
-            resume.education = json.dumps(education) if education else None
+                # Extract text based on file type, or read it back from the text store
+                to_extract.append((resume, get_resume_text(resume, refresh=force)))
+        except Exception as e:
+            current_app.logger.error(f"Error processing resume {resume.id}: {str(e)}")
+            resume.status = 'error'
+    db.session.commit()
+    
+    try:
+        extracted = extract_resume_batch(text for _, text in to_extract)
+    except Exception as e:
+        current_app.logger.error(f"Error extracting resume batch {resume_ids}: {str(e)}")
+        extracted = [None] * len(to_extract)
+    
+    lsh_index = get_lsh_index() if to_extract else None
+    for (resume, text), fields in zip(to_extract, extracted):
+        try:
+            if fields is None:
+                raise ValueError("Extraction failed")
+            apply_extracted_fields(resume, fields)
+            index_near_duplicates([resume], [text], lsh_index)
             
             # If a job is associated, calculate similarity score
-            if resume.job_id:
-                job = Job.query.get(resume.job_id)
-                if job:
-                    job_text = f"{job.title} {job.description} {job.requirements}"
-                    resume.score = calculate_similarity(text, job_text)
-                    
-                    # Extract keywords from job description
-                    job_keywords = extract_skills(job_text)
-                    
-                    # Find matched and missing keywords
-                    matched_keywords = [skill for skill in skills if skill in job_keywords]
-                    missing_keywords = [skill for skill in job_keywords if skill not in skills]
-                    
-                    resume.matched_keywords = json.dumps(matched_keywords) if matched_keywords else None
-                    resume.missing_keywords = json.dumps(missing_keywords) if missing_keywords else None
+            score_resume(resume, text, fields['skills'])
             
             # Update status to processed
             resume.status = 'processed'
-            db.session.commit()
-            
         except Exception as e:
-            current_app.logger.error(f"Error processing resume {resume_id}: {str(e)}")
-            if 'resume' in locals():
-                resume.status = 'error'
-                db.session.commit()
+            current_app.logger.error(f"Error processing resume {resume.id}: {str(e)}")
+            resume.status = 'error'
+    
+    # Keep the admin full-text search in step with the extracted fields
+    texts = {resume.id: text for resume, text in to_extract}
+    store = get_text_store()
+    index_resumes([(resume, texts[resume.id] if resume.id in texts else store.get(text_key(resume)))
+                   for resume in resumes if resume.status == 'processed'])
+    failed = [resume.id for resume in resumes if resume.status == 'error']
+    for resume_id in failed:
+        # Reprocessed resumes that now fail drop out of keyword search
+        remove_from_index(resume_id)
+    db.session.commit()
+    
+    store_vectors([(resume, text) for resume, text in to_extract if resume.status == 'processed'])
+    if failed:
+        # Reprocessed resumes that now fail drop out of ranking
+        get_vector_store().delete(failed)
 
-def export_resumes_to_excel(job_id=None, output_path=None):
-    """Export resumes data to an Excel file."""
+def store_vectors(resumes_with_text):
+    """Add the TF-IDF vectors of freshly processed resumes to the vector store used for ranking."""
+    vectorizer = get_vectorizer()
+    if vectorizer is None or not resumes_with_text:
+        return
+    
     try:
-        # Query resumes
-        query = Resume.query
-        if job_id:
-            query = query.filter_by(job_id=job_id)
-        
-        resumes = query.all()
-        
-        # Prepare data for DataFrame
-        data = []
-        for resume in resumes:
-            skills = json.loads(resume.skills) if resume.skills else []
-            experience = json.loads(resume.experience) if resume.experience else {}
-            education = json.loads(resume.education) if resume.education else {}
-            matched_keywords = json.loads(resume.matched_keywords) if resume.matched_keywords else []
-            missing_keywords = json.loads(resume.missing_keywords) if resume.missing_keywords else []
-            
-            data.append({
-                'ID': resume.id,
-                'Name': resume.name or 'N/A',
-                'Email': resume.email or 'N/A',
-                'Phone': resume.phone or 'N/A',
-                'Filename': resume.original_filename,
-                'Upload Date': resume.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'Score': f"{resume.score}%" if resume.score is not None else 'N/A',
-                'Skills': ', '.join(skills) if skills else 'N/A',
-                'Experience': json.dumps(experience, indent=2) if experience else 'N/A',
-                'Education': json.dumps(education, indent=2) if education else 'N/A',
-                'Matched Keywords': ', '.join(matched_keywords) if matched_keywords else 'N/A',
-                'Missing Keywords': ', '.join(missing_keywords) if missing_keywords else 'N/A',
-                'Status': resume.status.capitalize()
-            })
+        resume_ids = [resume.id for resume, _ in resumes_with_text]
+        vectors = vectorizer.transform([text for _, text in resumes_with_text])
+        if not get_vector_store().append(resume_ids, vectors, model_stamp(vectorizer)):
+            # The store still holds the previous model's vectors; a sync adds these once it is rebuilt
+            enqueue_unique('sync_vectors', wake=False)
+    except Exception as e:
+        # The scheduled sync adds missing vectors, so this only delays ranking them
+        current_app.logger.error(f"Error storing resume vectors: {str(e)}")
+
+@task_handler('process_resume')
+def process_resume(resume_id, force=False):
+    """Process a single resume; see process_resumes."""
+    process_resumes([resume_id], force=force)
+
+@task_handler('rescore_job')
+def rescore_job(job_id):
+    """
+    Recompute the scores of a job's processed resumes after the job was edited.
+    Resumes are scored in batches from the text store, without reopening the files.
+    """
+    resume_ids = [row.id for row in db.session.query(Resume.id)
+                  .filter_by(job_id=job_id, status='processed').order_by(Resume.id)]
+    report_progress(0, len(resume_ids))
+    
+    job = db.session.get(Job, job_id)
+    if not job:
+        return
+    
+    job_keywords = get_job_profile(job).keywords
+    batch_size = current_app.config['RESCORE_BATCH_SIZE']
+    
+    for start in range(0, len(resume_ids), batch_size):
+        resumes = Resume.query.filter(Resume.id.in_(resume_ids[start:start + batch_size])).all()
+        scores = score_texts(job, [get_resume_text(resume) for resume in resumes])
         
-        # Create DataFrame
-        df = pd.DataFrame(data)
+        for resume, score in zip(resumes, scores):
+            resume.score = score
+            resume.score_stale = False
+            match_keywords(resume, resume.skills or [], job_keywords)
+        db.session.commit()
+        report_progress(start + len(resumes))
+
+# Columns of resume exports, in order
+EXPORT_COLUMNS = ['ID', 'Name', 'Email', 'Phone', 'Filename', 'Upload Date', 'Score', 'Skills',
+                  'Experience', 'Education', 'Matched Keywords', 'Missing Keywords', 'Status']
+
+def iter_export_rows(job_id=None, status=None, chunk_size=500):
+    """
+    Yield one list of cell values per resume, in EXPORT_COLUMNS order.
+    Only the exported columns are selected, chunk_size rows at a time, so
+    memory does not grow with the export.
+    """
+    query = db.select(
+        Resume.id, Resume.name, Resume.email, Resume.phone, Resume.original_filename, Resume.upload_date,
+        Resume.score, Resume._skills, Resume._experience, Resume._education,
+        Resume._matched_keywords, Resume._missing_keywords, Resume.status
+    ).order_by(Resume.id).execution_options(yield_per=chunk_size)
+    if job_id:
+        query = query.where(Resume.job_id == job_id)
+    if status:
+        query = query.where(Resume.status == status)
+    
+    def decoded(value, default):
+        return (unpack(value) if isinstance(value, (bytes, str)) else value) or default
+    
+    for row in db.session.execute(query):
+        skills = decoded(row._skills, [])
+        experience = decoded(row._experience, {})
+        education = decoded(row._education, {})
+        matched_keywords = decoded(row._matched_keywords, [])
+        missing_keywords = decoded(row._missing_keywords, [])
         
-        # If no output path provided, create one in the temp directory
+        yield [
+            row.id,
+            row.name or 'N/A',
+            row.email or 'N/A',
+            row.phone or 'N/A',
+            row.original_filename,
+            row.upload_date.strftime('%Y-%m-%d %H:%M:%S') if row.upload_date else 'N/A',
+            f"{row.score}%" if row.score is not None else 'N/A',
+            ', '.join(skills) if skills else 'N/A',
+            json.dumps(experience, indent=2) if experience else 'N/A',
+            json.dumps(education, indent=2) if education else 'N/A',
+            ', '.join(matched_keywords) if matched_keywords else 'N/A',
+            ', '.join(missing_keywords) if missing_keywords else 'N/A',
+            row.status.capitalize()
+        ]
+
+def iter_resumes_csv(job_id=None, status=None):
+    """Yield a CSV export of resumes a few rows at a time."""
+    import csv
+    import io
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(iter_export_rows(job_id, status), 1):
+        writer.writerow(row)
+        if count % 100 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_resumes_to_excel(job_id=None, output_path=None, status=None):
+    """
+    Export resumes data to an Excel file.
+    Rows go straight into a write-only workbook, which keeps them on disk instead of in memory.
+    """
+    from openpyxl import Workbook
+    
+    try:
+        # If no output path provided, create one in the exports folder
         if not output_path:
-            filename = f"resumes_export_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            filename = f"resumes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             output_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'exports', filename)
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # Export to Excel
-        df.to_excel(output_path, index=False, engine='openpyxl')
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Resumes')
+        sheet.append(EXPORT_COLUMNS)
+        for row in iter_export_rows(job_id, status):
+            sheet.append(row)
+        workbook.save(output_path)
         
         return output_path
     
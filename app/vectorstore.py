@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from flask import current_app
+from .models import db, Resume
+from .scoring import get_vectorizer, model_stamp
+from .tasks import task_handler, scheduled
+from .textstore import get_text_store, text_key
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# One record per appended vector; nnz -1 marks a deleted resume
+ROW_DTYPE = np.dtype([('resume_id', '<i8'), ('nnz', '<i8')])
+
+# Live rows of a store generation: resume ids, their record numbers and the CSR matrix of all records
+Snapshot = namedtuple('Snapshot', ['model', 'ids', 'records', 'matrix', 'dead'])
+
+class VectorStore:
+    """
+    Append-only store of sparse resume vectors in memory-mapped files.
+
+    A generation directory holds the CSR arrays of every vector ever appended
+    (data.f32, indices.i32) and a record file mapping each vector to its
+    resume (rows.i64). Replacing or deleting a resume appends a new record, so
+    readers never see files change under them. Compaction and model refits
+    write a new generation and switch the CURRENT pointer to it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._snapshot_key = None
+        self._snapshot = None
+
+    @contextmanager
+    def _locked(self):
+        """Serialise writers across processes."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'lock'), 'a+') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _generation(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _path(self, generation, name):
+        return os.path.join(self.root, generation, name)
+
+    def _meta(self, generation):
+        with open(self._path(generation, 'meta.json')) as f:
+            return json.load(f)
+
+    def _write(self, generation, resume_ids, matrix):
+        """Append vectors to a generation; the record file is written last so readers never see partial rows."""
+        matrix = matrix.tocsr()
+        matrix.sort_indices()
+        with open(self._path(generation, 'data.f32'), 'ab') as f:
+            f.write(matrix.data.astype('<f4').tobytes())
+        with open(self._path(generation, 'indices.i32'), 'ab') as f:
+            f.write(matrix.indices.astype('<i4').tobytes())
+
+        records = np.empty(len(resume_ids), dtype=ROW_DTYPE)
+        records['resume_id'] = resume_ids
+        records['nnz'] = np.diff(matrix.indptr)
+        with open(self._path(generation, 'rows.i64'), 'ab') as f:
+            f.write(records.tobytes())
+
+    def append(self, resume_ids, matrix, model):
+        """
+        Store the vectors of resumes, replacing earlier ones.
+        Returns False without writing when the store holds vectors of another model.
+        """
+        if not len(resume_ids):
+            return True
+        with self._locked():
+            generation = self._generation()
+            if generation is None or self._meta(generation)['model'] != model:
+                return False
+            self._write(generation, resume_ids, matrix)
+            return True
+
+    def delete(self, resume_ids):
+        """Write tombstones for resumes; their space is reclaimed by compaction."""
+        if not len(resume_ids):
+            return
+        with self._locked():
+            generation = self._generation()
+            if generation is None:
+                return
+            records = np.empty(len(resume_ids), dtype=ROW_DTYPE)
+            records['resume_id'] = resume_ids
+            records['nnz'] = -1
+            with open(self._path(generation, 'rows.i64'), 'ab') as f:
+                f.write(records.tobytes())
+
+    def rebuild(self, model, n_features, batches):
+        """Write a new generation from (resume ids, matrix) batches and make it current."""
+        with self._locked():
+            self._rebuild(model, n_features, batches)
+
+    def _rebuild(self, model, n_features, batches):
+        old_generation = self._generation()
+        number = int(old_generation.split('-')[1]) + 1 if old_generation else 1
+        generation = f"gen-{number:06d}"
+
+        os.makedirs(os.path.join(self.root, generation), exist_ok=True)
+        for name in ('data.f32', 'indices.i32', 'rows.i64'):
+            open(self._path(generation, name), 'wb').close()
+        for resume_ids, matrix in batches:
+            self._write(generation, resume_ids, matrix)
+        with open(self._path(generation, 'meta.json'), 'w') as f:
+            json.dump({'model': model, 'features': n_features}, f)
+
+        tmp_path = os.path.join(self.root, f"CURRENT.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(generation)
+        os.replace(tmp_path, os.path.join(self.root, 'CURRENT'))
+
+        if old_generation:
+            # Processes still mapping the old files keep them until they reopen
+            shutil.rmtree(os.path.join(self.root, old_generation), ignore_errors=True)
+
+    def compact(self, batch_size=10000):
+        """Rewrite the current generation without deleted and replaced vectors."""
+        with self._locked():
+            snapshot = self.snapshot()
+            if snapshot is None:
+                return 0
+
+            def live_batches():
+                for start in range(0, len(snapshot.ids), batch_size):
+                    records = snapshot.records[start:start + batch_size]
+                    yield snapshot.ids[start:start + batch_size], snapshot.matrix[records]
+
+            self._rebuild(snapshot.model, snapshot.matrix.shape[1], live_batches())
+            return snapshot.dead
+
+    def snapshot(self):
+        """
+        Return the live vectors as a Snapshot, or None if nothing was stored yet.
+        The arrays are memory-mapped, so processes share the pages of one copy.
+        """
+        while True:
+            generation = self._generation()
+            if generation is None:
+                return None
+            try:
+                return self._load(generation)
+            except FileNotFoundError:
+                # Replaced by a compaction or refit while it was being read
+                if self._generation() == generation:
+                    raise
+
+    def _load(self, generation):
+        from scipy.sparse import csr_matrix
+
+        size = os.path.getsize(self._path(generation, 'rows.i64'))
+        count = size // ROW_DTYPE.itemsize
+        if self._snapshot_key == (generation, count):
+            return self._snapshot
+
+        meta = self._meta(generation)
+        rows = np.fromfile(self._path(generation, 'rows.i64'), dtype=ROW_DTYPE, count=count)
+        lengths = np.maximum(rows['nnz'], 0)
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        total = int(indptr[-1])
+
+        if total:
+            data = np.memmap(self._path(generation, 'data.f32'), dtype='<f4', mode='r', shape=(total,))
+            indices = np.memmap(self._path(generation, 'indices.i32'), dtype='<i4', mode='r', shape=(total,))
+        else:
+            data = np.empty(0, dtype='<f4')
+            indices = np.empty(0, dtype='<i4')
+        if total < 2 ** 31:
+            # Same index dtype as the indices, so scipy keeps the memory map instead of copying
+            indptr = indptr.astype(np.int32)
+        matrix = csr_matrix((data, indices, indptr), shape=(count, meta['features']), copy=False)
+
+        # The last record of each resume wins; tombstones hide it
+        resume_ids = rows['resume_id']
+        unique_ids, reversed_positions = np.unique(resume_ids[::-1], return_index=True)
+        last = count - 1 - reversed_positions
+        alive = rows['nnz'][last] >= 0
+
+        self._snapshot = Snapshot(meta['model'], unique_ids[alive], last[alive], matrix, count - int(alive.sum()))
+        self._snapshot_key = (generation, count)
+        return self._snapshot
+
+def get_vector_store():
+    """Return the resume vector store of the current app."""
+    app = current_app._get_current_object()
+    if 'vector_store' not in app.extensions:
+        app.extensions['vector_store'] = VectorStore(app.config['VECTOR_STORE_FOLDER'])
+    return app.extensions['vector_store']
+
+def sync_vector_store(vectorizer, batch_size=1000):
+    """
+    Bring the store in line with the processed resumes in the database and
+    return its snapshot. Vectors of another model are rebuilt from the text store.
+    Reads every processed resume id, so it runs in tasks, never in a request.
+    """
+    store = get_vector_store()
+    model = model_stamp(vectorizer)
+    rows = db.session.query(Resume.id, Resume.file_hash) \
+        .filter(Resume.status == 'processed', Resume.duplicate_of_id.is_(None)) \
+        .order_by(Resume.id).all()
+    text_store = get_text_store()
+
+    def batches(rows):
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            texts = [text_store.get(text_key(row)) or '' for row in batch]
+            yield np.array([row.id for row in batch], dtype=np.int64), vectorizer.transform(texts)
+
+    snapshot = store.snapshot()
+    if snapshot is None or snapshot.model != model:
+        store.rebuild(model, len(vectorizer.vocabulary_), batches(rows))
+        return store.snapshot()
+
+    current_ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+    store.delete(snapshot.ids[~np.isin(snapshot.ids, current_ids)])
+    missing = [row for row, stored in zip(rows, np.isin(current_ids, snapshot.ids)) if not stored]
+    for resume_ids, matrix in batches(missing):
+        store.append(resume_ids, matrix, model)
+    return store.snapshot()
+
+@scheduled('sync_vectors', 'VECTOR_SYNC_INTERVAL')
+@task_handler('sync_vectors')
+def sync_vectors():
+    """
+    Task handler reconciling the store with the database: vectors a worker
+    could not append while a refit rebuilt the store, duplicates promoted to
+    originals, resumes that failed reprocessing.
+    """
+    vectorizer = get_vectorizer()
+    if vectorizer is not None:
+        sync_vector_store(vectorizer)
+
+@scheduled('compact_vectors', 'VECTOR_COMPACT_INTERVAL')
+@task_handler('compact_vectors')
+def compact_vectors():
+    """Task handler compacting the store once enough of it is deleted or replaced vectors."""
+    store = get_vector_store()
+    snapshot = store.snapshot()
+    if snapshot is None or not snapshot.dead:
+        return
+
+    if snapshot.dead / (snapshot.dead + len(snapshot.ids)) >= current_app.config['VECTOR_COMPACT_MIN_DEAD']:
+        store.compact()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Automated Resume Screener
+Usage: python benchmark.py [benchmark ...]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+import timeit
+
+STARTUP_CODE = """
+import sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - start, 'spacy' in sys.modules)
+"""
+
+def bench_startup(runs=5):
+    """Time a fresh interpreter importing the app and calling create_app()."""
+    print("⏱️  Application startup (import + create_app)")
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_CODE],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        seconds, spacy_loaded = result.stdout.split()[-2:]
+        timings.append(float(seconds))
+
+    print(f"   runs: {runs}, best: {min(timings) * 1000:.0f} ms, median: {statistics.median(timings) * 1000:.0f} ms")
+    print(f"   spaCy imported at startup: {spacy_loaded}")
+
+SAMPLE_RESUME = """John Doe
+john.doe@example.com | +1 555-123-4567
+Senior Software Engineer
+Acme Corp, Jan 2020 - Present
+Built Python and Docker services on AWS.
+Software Engineer
+Globex, Feb 2016 - December 2019
+Education
+Bachelor of Science in Computer Science
+Stanford University
+Master of Science in Physics
+Massachusetts Institute of Technology
+"""
+
+def legacy_extract_experience(text):
+    """extract_experience before the single-pass extractor, kept for comparison."""
+    experience = {}
+    date_pattern = r'(\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4})\s*-\s*((?:(?:Present|Current)|(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4})?)'
+    title_pattern = r'(?:\n|^)\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s*(?:\n|$)'
+    dates = [match.group(0).strip() for match in re.finditer(date_pattern, text, re.IGNORECASE)]
+    titles = [match.group(1).strip() for match in re.finditer(title_pattern, text) if len(match.group(1).split()) <= 4]
+    if dates:
+        experience['start_date'] = dates[0].split('-')[0].strip()
+        experience['end_date'] = dates[0].split('-')[1].strip() if '-' in dates[0] else 'Present'
+    if titles:
+        experience['most_recent_title'] = titles[0]
+    return experience
+
+def legacy_extract_education(text):
+    """extract_education before the single-pass extractor, kept for comparison."""
+    education = {}
+    degree_patterns = [
+        r'\b(?:B\.?S\.?|Bachelor(?:\'?s)?(?:\s+of\s+Science)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:M\.?S\.?|Master(?:\'?s)?(?:\s+of\s+Science)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:Ph\.?D\.?|Doctor(?:ate)?(?:\s+of\s+Philosophy)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:B\.?A\.?|Bachelor(?:\'?s)?(?:\s+of\s+Arts)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:M\.?A\.?|Master(?:\'?s)?(?:\s+of\s+Arts)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:B\.?E\.?|Bachelor(?:\'?s)?(?:\s+of\s+Engineering)?(?:\s+in\s+\w+)?)\b',
+        r'\b(?:M\.?E\.?|Master(?:\'?s)?(?:\s+of\s+Engineering)?(?:\s+in\s+\w+)?)\b',
+    ]
+    school_pattern = r'\b(?:University|College|Institute|School|Academy)\b.*?\n'
+    degrees = []
+    for pattern in degree_patterns:
+        degrees.extend([match.group(0) for match in re.finditer(pattern, text, re.IGNORECASE)])
+    schools = [match.group(0).strip() for match in re.finditer(school_pattern, text, re.IGNORECASE)]
+    if degrees:
+        education['degrees'] = list(set(degrees))
+    if schools:
+        education['schools'] = list(set(schools))
+    return education
+
+def legacy_extract_contact_info(text):
+    """extract_contact_info before the single-pass extractor, kept for comparison."""
+    contact = {}
+    emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+    if emails:
+        contact['email'] = emails[0]
+    phones = re.findall(r'(\+\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', text)
+    if phones:
+        contact['phone'] = phones[0].strip()
+    return contact
+
+def bench_extractors(number=2000):
+    """Compare the single-pass detail extractor with the previous per-field regex passes."""
+    from app.utils import extract_details
+
+    print("⏱️  Experience/education/contact extraction")
+    for label, text in [('1 page', SAMPLE_RESUME), ('10 pages', SAMPLE_RESUME * 10)]:
+        runs = max(number // len(text) * len(SAMPLE_RESUME), 10)
+        legacy = timeit.timeit(lambda: (legacy_extract_experience(text),
+                                        legacy_extract_education(text),
+                                        legacy_extract_contact_info(text)), number=runs)
+        single = timeit.timeit(lambda: extract_details(text), number=runs)
+        print(f"   {label}: legacy {legacy / runs * 1e6:.0f} µs, single pass {single / runs * 1e6:.0f} µs "
+              f"({legacy / single:.1f}x)")
+
+SAMPLE_FIELDS = {
+    'skills': ['python', 'docker', 'aws', 'kubernetes', 'postgresql', 'react', 'git', 'linux'] * 3,
+    'experience': {'most_recent_title': 'Senior Software Engineer', 'total_years': 9,
+                   'positions': [{'title': 'Software Engineer', 'company': 'Globex', 'start': '2016-02', 'end': '2019-12'}] * 4},
+    'education': [{'degree': 'Bachelor of Science in Computer Science', 'school': 'Stanford University'}] * 2,
+    'matched_keywords': ['python', 'docker', 'aws'],
+    'missing_keywords': ['terraform', 'go'],
+}
+
+def bench_packed(number=20000):
+    """Compare JSON text columns with the packed representation of resume data."""
+    import json
+    from app.packed import pack, unpack, orjson
+
+    print(f"⏱️  Resume data (de)serialization, 5 columns (orjson: {'yes' if orjson else 'no'})")
+    text = {name: json.dumps(value) for name, value in SAMPLE_FIELDS.items()}
+    packed = {name: pack(value) for name, value in SAMPLE_FIELDS.items()}
+
+    legacy_write = timeit.timeit(lambda: [json.dumps(value) for value in SAMPLE_FIELDS.values()], number=number)
+    packed_write = timeit.timeit(lambda: [pack(value) for value in SAMPLE_FIELDS.values()], number=number)
+    legacy_read = timeit.timeit(lambda: [json.loads(value) for value in text.values()], number=number)
+    packed_read = timeit.timeit(lambda: [unpack(value) for value in packed.values()], number=number)
+
+    print(f"   write: json {legacy_write / number * 1e6:.1f} µs, packed {packed_write / number * 1e6:.1f} µs "
+          f"({legacy_write / packed_write:.1f}x)")
+    print(f"   read: json {legacy_read / number * 1e6:.1f} µs, packed {packed_read / number * 1e6:.1f} µs "
+          f"({legacy_read / packed_read:.1f}x)")
+    print(f"   size: json {sum(len(v.encode()) for v in text.values())} bytes, "
+          f"packed {sum(len(v) for v in packed.values())} bytes")
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'extractors': bench_extractors,
+    'packed': bench_packed,
+}
+
+def main():
+    """Run the benchmarks named on the command line, or all of them."""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
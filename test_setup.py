@@ -6,6 +6,51 @@ Test script to verify the Automated Resume Screener setup
 import sys
 import os
 import importlib
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def temporary_app(**config):
+    """Create the app on a throwaway database and data folders, restoring the environment afterwards."""
+    saved_env = {key: os.environ.get(key) for key in ('SQLALCHEMY_DATABASE_URI', 'WORKER_CONCURRENCY')}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'test.db')
+        os.environ['WORKER_CONCURRENCY'] = '0'
+        try:
+            from app import create_app
+            
+            app = create_app()
+            app.config['WTF_CSRF_ENABLED'] = False
+            app.config['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+            app.config['TFIDF_MODEL_PATH'] = os.path.join(tmp, 'tfidf_model.joblib')
+            app.config['VECTOR_STORE_FOLDER'] = os.path.join(tmp, 'vectors')
+            app.config['TEXT_STORE_FOLDER'] = os.path.join(tmp, 'text_store')
+            app.config.update(config)
+            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            yield app
+        finally:
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+def add_user(username, is_admin=False):
+    """Add a user whose email is <username>@example.com and password is secret123."""
+    from app import db
+    from app.models import User
+    
+    user = User(username=username, email=f'{username}@example.com', is_admin=is_admin)
+    user.set_password('secret123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def login(app, username):
+    """Return a test client logged in as a user made by add_user."""
+    client = app.test_client()
+    client.post('/auth/login', data={'email': f'{username}@example.com', 'password': 'secret123'})
+    return client
 
 def test_imports():
     """Test if all required modules can be imported."""
@@ -101,6 +146,361 @@ def test_file_processing():
         print(f"❌ File processing test failed: {e}")
         return False
 
+def test_resume_details():
+    """Test that details sharing a line with a school name are all extracted."""
+    print("\n🔍 Testing resume detail extraction...")
+    from app.utils import extract_details
+    
+    experience, education, contact = extract_details("Stanford University, B.S. 2015\n")
+    assert education['degrees'] == ['B.S.'], education
+    assert education['schools'] == ['Stanford University'], education
+    
+    experience, education, contact = extract_details("Institute of Technology - john@x.com - 555 123 4567\n")
+    assert education['schools'] == ['Institute of Technology'], education
+    assert contact == {'email': 'john@x.com', 'phone': '555 123 4567'}, contact
+    
+    experience, education, contact = extract_details("State College | Master of Science in Physics; jane@y.org\n")
+    assert education == {'degrees': ['Master of Science in Physics'], 'schools': ['State College']}, education
+    assert contact == {'email': 'jane@y.org'}, contact
+    print("✅ Degrees, emails and phones after a school name are found")
+    return True
+
+def test_list_query_count():
+    """Test that admin list pages run the same number of queries however many rows they show."""
+    print("\n🔍 Testing admin list page queries...")
+    from sqlalchemy import event
+    from app import db
+    from app.models import Resume, Job
+    
+    with temporary_app(STATS_CACHE_TTL=0) as app:
+        with app.app_context():
+            add_user('admin', is_admin=True)
+        client = login(app, 'admin')
+        
+        def add_resumes(count):
+            with app.app_context():
+                for i in range(count):
+                    job = Job(title=f'Job {i}', description='Python developer')
+                    db.session.add(job)
+                    db.session.add(Resume(filename=f'r{i}.pdf', file_path=f'r{i}.pdf', original_filename=f'r{i}.pdf',
+                                          status='processed', skills='["python"]', job=job))
+                db.session.commit()
+        
+        def count_queries(url):
+            queries = []
+            with app.app_context():
+                listener = lambda *args: queries.append(args[2])
+                event.listen(db.engine, 'before_cursor_execute', listener)
+                try:
+                    response = client.get(url)
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', listener)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+            return len(queries)
+        
+        add_resumes(2)
+        few = {url: count_queries(url) for url in ('/admin/', '/admin/resumes')}
+        add_resumes(18)
+        many = {url: count_queries(url) for url in ('/admin/', '/admin/resumes')}
+        
+        for url in few:
+            assert few[url] == many[url], f"{url}: {few[url]} queries for 2 resumes, {many[url]} for 20"
+            print(f"✅ {url} runs {many[url]} queries")
+    return True
+
+def test_view_resume():
+    """Test that the resume page renders for its owner and for admins, with recommended jobs."""
+    print("\n🔍 Testing resume page...")
+    from app import db
+    from app.models import Resume, Job
+    from app.textstore import get_text_store, text_key
+    
+    with temporary_app() as app:
+        with app.app_context():
+            owner = add_user('owner')
+            add_user('admin', is_admin=True)
+            job = Job(title='Python Developer', description='Python and Flask\nDocker', requirements='python, flask')
+            db.session.add(job)
+            db.session.add(Job(title='Pastry Chef', description='Bake bread and cakes', requirements='baking'))
+            db.session.commit()
+            
+            resume = Resume(filename='r.pdf', file_path='r.pdf', original_filename='r.pdf', status='processed',
+                            score=72.5, skills=['python', 'flask'], experience={'most_recent_title': 'Developer'},
+                            education={'degrees': ['B.S.']}, matched_keywords=['python'], missing_keywords=['docker'],
+                            user_id=owner.id, job=job)
+            db.session.add(resume)
+            db.session.commit()
+            get_text_store().put(text_key(resume), 'Python developer building Flask services in Docker')
+            resume_id = resume.id
+        
+        for username in ('owner', 'admin'):
+            response = login(app, username).get(f'/resume/{resume_id}')
+            assert response.status_code == 200, f"/resume/{resume_id} returned {response.status_code} for {username}"
+            html = response.get_data(as_text=True)
+            assert 'Recommended Jobs' in html and 'Python Developer' in html
+            print(f"✅ Resume page renders for {username}")
+    return True
+
+def test_job_lists():
+    """Test that both job lists render with applicant counts and score statistics."""
+    print("\n🔍 Testing job list pages...")
+    from app import db
+    from app.models import Resume, Job
+    
+    with temporary_app() as app:
+        with app.app_context():
+            add_user('admin', is_admin=True)
+            job = Job(title='Python Developer', description='Python and Flask', requirements='python')
+            db.session.add(job)
+            db.session.add(Job(title='Pastry Chef', description='Bake bread', requirements='baking'))
+            for i, (status, score) in enumerate((('processed', 40.0), ('processed', 90.0), ('pending', None), ('error', None))):
+                db.session.add(Resume(filename=f'r{i}.pdf', file_path=f'r{i}.pdf', original_filename=f'r{i}.pdf',
+                                      status=status, score=score, job=job))
+            db.session.commit()
+        
+        client = login(app, 'admin')
+        for url in ('/admin/jobs', '/jobs'):
+            response = client.get(url)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+            html = response.get_data(as_text=True)
+            assert 'Python Developer' in html and 'Pastry Chef' in html
+            assert '65.0' in html and '90.0' in html, f"{url} is missing the score statistics"
+            print(f"✅ {url} renders per-job statistics")
+    return True
+
+def test_skill_matcher():
+    """Test that skills only match on word boundaries and synonyms map to their canonical name."""
+    print("\n🔍 Testing skill matching...")
+    from app.skills import SkillMatcher, get_skill_matcher
+    
+    matcher = SkillMatcher({'go': 'go', 'golang': 'go', 'java': 'java', 'javascript': 'javascript',
+                            'js': 'javascript', 'c++': 'c++', 'r': 'r'})
+    assert matcher.find("Google, Javanese and jsonnet") == []
+    assert matcher.find("JavaScript (JS) and Java; Golang, C++ and R") == ['javascript', 'java', 'go', 'c++', 'r']
+    assert matcher.find("Go/Java") == ['go', 'java']
+    print("✅ Skills inside longer words are not matched")
+    
+    taxonomy = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'data', 'skills.txt')
+    found = get_skill_matcher(taxonomy).find("Built ReactJS apps on NodeJS; Python3 and golang services")
+    assert {'react', 'node.js', 'python', 'go'} <= set(found), found
+    assert 'java' not in found and 'javascript' not in found, found
+    print("✅ Taxonomy synonyms resolve to canonical skills")
+    return True
+
+def test_vector_store():
+    """Test that replaced and deleted vectors are hidden from snapshots and dropped by compaction."""
+    print("\n🔍 Testing vector store...")
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    from app.vectorstore import VectorStore
+    
+    def live(store):
+        snapshot = store.snapshot()
+        rows = snapshot.matrix[snapshot.records].toarray()
+        return dict(zip(snapshot.ids.tolist(), rows.tolist())), snapshot.dead
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(tmp)
+        assert store.snapshot() is None
+        store.rebuild('model-1', 3, [([1, 2, 3], csr_matrix(np.array([[1, 0, 0], [0, 2, 0], [0, 0, 3]], dtype=np.float32)))])
+        assert store.append([2], csr_matrix(np.array([[0, 5, 5]], dtype=np.float32)), 'model-1')
+        assert not store.append([4], csr_matrix(np.array([[1, 1, 1]], dtype=np.float32)), 'model-2')
+        store.delete([3])
+        
+        vectors, dead = live(store)
+        assert vectors == {1: [1, 0, 0], 2: [0, 5, 5]}, vectors
+        assert dead == 3, dead
+        print("✅ Snapshots keep the last vector of each resume and skip tombstones")
+        
+        assert store.compact() == 3
+        vectors, dead = live(store)
+        assert vectors == {1: [1, 0, 0], 2: [0, 5, 5]}, vectors
+        assert dead == 0, dead
+        assert sorted(name for name in os.listdir(tmp) if name.startswith('gen-')) == ['gen-000002']
+        print("✅ Compaction rewrites only the live vectors into a new generation")
+    return True
+
+def test_api_cursor():
+    """Test that /api/resumes pages through every resume once, newest first, and ends with no cursor."""
+    print("\n🔍 Testing API pagination...")
+    from datetime import datetime
+    from app import db
+    from app.models import Resume
+    
+    with temporary_app() as app:
+        with app.app_context():
+            owner = add_user('owner')
+            other = add_user('other')
+            # Resumes sharing an upload date are ordered by id, including across a page boundary
+            dates = [datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 2), datetime(2024, 1, 2), datetime(2024, 1, 3)]
+            for i, upload_date in enumerate(dates):
+                db.session.add(Resume(filename=f'r{i}.pdf', file_path=f'r{i}.pdf', original_filename=f'r{i}.pdf',
+                                      status='processed', upload_date=upload_date, user_id=owner.id))
+            db.session.add(Resume(filename='x.pdf', file_path='x.pdf', original_filename='x.pdf',
+                                  status='processed', upload_date=datetime(2024, 1, 2), user_id=other.id))
+            db.session.commit()
+            expected = [row.id for row in Resume.query.filter_by(user_id=owner.id)
+                        .order_by(Resume.upload_date.desc(), Resume.id.desc())]
+        
+        client = login(app, 'owner')
+        seen, pages, cursor = [], [], None
+        while True:
+            response = client.get('/api/resumes', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+            assert response.status_code == 200, f"/api/resumes returned {response.status_code}"
+            data = response.get_json()
+            pages.append(len(data['resumes']))
+            seen += [resume['id'] for resume in data['resumes']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        assert seen == expected, (seen, expected)
+        assert pages == [2, 2, 1], pages
+        print("✅ Cursor pages return every resume once, in order")
+        
+        assert client.get('/api/resumes', query_string={'cursor': 'not-a-cursor'}).status_code == 400
+        print("✅ Invalid cursors are rejected")
+    return True
+
+def test_export_rows():
+    """Test that the CSV and Excel exports hold one decoded row per resume, honouring the filters."""
+    print("\n🔍 Testing resume export...")
+    import csv
+    import io
+    import json
+    from openpyxl import load_workbook
+    from app import db
+    from app.models import Resume
+    from app.utils import EXPORT_COLUMNS
+    
+    with temporary_app() as app:
+        with app.app_context():
+            add_user('admin', is_admin=True)
+            db.session.add(Resume(filename='a.pdf', file_path='a.pdf', original_filename='a.pdf', status='processed',
+                                  name='Ada Lovelace', email='ada@example.com', score=88.5, skills=['python', 'sql'],
+                                  education={'degrees': ['B.S.']}, matched_keywords=['python'], missing_keywords=['docker']))
+            # More rows than the CSV writer buffers at once
+            for i in range(150):
+                db.session.add(Resume(filename=f'r{i}.pdf', file_path=f'r{i}.pdf', original_filename=f'r{i}.pdf', status='pending'))
+            db.session.commit()
+        
+        client = login(app, 'admin')
+        response = client.get('/admin/resumes/export', query_string={'format': 'csv'})
+        assert response.status_code == 200 and response.mimetype == 'text/csv'
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        assert rows[0] == EXPORT_COLUMNS, rows[0]
+        assert len(rows) == 152, len(rows)
+        record = dict(zip(EXPORT_COLUMNS, rows[1]))
+        assert (record['Name'], record['Email'], record['Phone']) == ('Ada Lovelace', 'ada@example.com', 'N/A'), record
+        assert (record['Score'], record['Skills'], record['Status']) == ('88.5%', 'python, sql', 'Processed'), record
+        assert (record['Matched Keywords'], record['Missing Keywords']) == ('python', 'docker'), record
+        assert json.loads(record['Education']) == {'degrees': ['B.S.']} and record['Experience'] == 'N/A', record
+        print("✅ CSV export has a decoded row per resume")
+        
+        response = client.get('/admin/resumes/export', query_string={'status': 'processed'})
+        assert response.status_code == 200, f"Excel export returned {response.status_code}"
+        sheet = load_workbook(io.BytesIO(response.get_data()), read_only=True)['Resumes']
+        rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+        assert rows[0] == EXPORT_COLUMNS and len(rows) == 2, rows
+        assert dict(zip(EXPORT_COLUMNS, rows[1]))['Skills'] == 'python, sql', rows[1]
+        print("✅ Excel export applies the status filter")
+    return True
+
+def test_near_duplicates():
+    """Test that near-duplicate resumes are linked to the first resume of their cluster."""
+    print("\n🔍 Testing near-duplicate detection...")
+    from app import db
+    from app.models import Resume
+    from app.minhash import LSHIndex, estimate_similarity, index_near_duplicates, minhash_signature
+    
+    base = ("Senior software engineer with eight years of experience building Python and Flask services, "
+            "designing PostgreSQL schemas, running Docker and Kubernetes deployments on AWS, mentoring junior "
+            "developers, leading code reviews and improving continuous integration pipelines for a payments "
+            "platform serving millions of customers across Europe and North America every single day")
+    texts = [
+        base,
+        base.replace('eight years', 'nine years'),
+        base.replace('Europe', 'Asia'),
+        "Pastry chef baking bread, croissants and wedding cakes for a busy family bakery since 2010",
+    ]
+    assert estimate_similarity(minhash_signature(texts[0]), minhash_signature(texts[1])) >= 0.8
+    assert estimate_similarity(minhash_signature(texts[0]), minhash_signature(texts[3])) < 0.2
+    
+    with temporary_app(NEAR_DUPLICATE_THRESHOLD=0.8) as app:
+        with app.app_context():
+            resumes = [Resume(filename=f'r{i}.pdf', file_path=f'r{i}.pdf', original_filename=f'r{i}.pdf', status='processing')
+                       for i in range(len(texts))]
+            db.session.add_all(resumes)
+            db.session.commit()
+            
+            index = LSHIndex()
+            # The first two arrive in one batch, the others later, as separate tasks would
+            index_near_duplicates(resumes[:2], texts[:2], index)
+            db.session.commit()
+            index_near_duplicates(resumes[2:], texts[2:], index)
+            db.session.commit()
+            
+            links = [db.session.get(Resume, resume.id).near_duplicate_of_id for resume in resumes]
+            first = resumes[0].id
+            assert links == [None, first, first, None], links
+            assert len(index) == len(texts)
+    print("✅ Near duplicates link to the first resume of their cluster, unrelated resumes stay apart")
+    return True
+
+def test_bulk_upload():
+    """Test that a bulk upload saves every resume of a ZIP archive and reports a status per file."""
+    print("\n🔍 Testing bulk upload...")
+    import io
+    import json
+    import zipfile
+    from app import db
+    from app.models import Resume, Job, Task
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('a.pdf', b'%PDF-1.4 first resume')
+        zf.writestr('folder/b.docx', b'second resume')
+        zf.writestr('notes.txt', b'not a resume')
+        zf.writestr('big.pdf', b'x' * 2048)
+        zf.writestr('__MACOSX/._a.pdf', b'resource fork')
+        zf.writestr('folder/', b'')
+    archive.seek(0)
+    
+    # With no pool running the resumes stay queued instead of being processed in the request
+    with temporary_app(WORKER_CONCURRENCY=1, WORKER_AUTOSTART=False, BULK_MAX_ENTRY_SIZE=1024, BULK_COMMIT_SIZE=2) as app:
+        with app.app_context():
+            add_user('admin', is_admin=True)
+            job = Job(title='Python Developer', description='Python')
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+        
+        response = login(app, 'admin').post('/admin/resumes/bulk-upload', headers={'Accept': 'application/json'}, data={
+            'job_id': job_id,
+            'files': [(archive, 'resumes.zip'), (io.BytesIO(b'%PDF-1.4 third resume'), 'c.pdf'),
+                      (io.BytesIO(b'garbage'), 'broken.zip')],
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, f"bulk upload returned {response.status_code}"
+        data = response.get_json()
+        statuses = {result['file']: result['status'] for result in data['results']}
+        assert statuses == {'a.pdf': 'queued', 'b.docx': 'queued', 'c.pdf': 'queued', 'notes.txt': 'error',
+                            'big.pdf': 'error', 'broken.zip': 'error'}, statuses
+        assert (data['queued'], data['failed']) == (3, 3), data
+        messages = {result['file']: result.get('message') for result in data['results'] if result['status'] == 'error'}
+        assert messages == {'notes.txt': 'Unsupported file type', 'big.pdf': 'File too large',
+                            'broken.zip': 'Not a valid ZIP archive'}, messages
+        print("✅ Every file of the upload gets a status")
+        
+        with app.app_context():
+            resumes = Resume.query.order_by(Resume.id).all()
+            assert [resume.original_filename for resume in resumes] == ['a.pdf', 'b.docx', 'c.pdf']
+            assert all(resume.status == 'pending' and resume.job_id == job_id for resume in resumes)
+            assert all(os.path.exists(resume.file_path) for resume in resumes)
+            queued = sorted(resume_id for task in Task.query.filter_by(kind='process_resumes', status='queued')
+                            for resume_id in json.loads(task.payload)['resume_ids'])
+            assert queued == [resume.id for resume in resumes], queued
+        print("✅ Uploaded resumes are saved and queued for processing")
+    return True
+
 def main():
     """Run all tests."""
     print("🧪 Testing Automated Resume Screener Setup")
@@ -111,7 +511,17 @@ def main():
         ("spaCy Model", test_spacy_model),
         ("Flask App", test_app_creation),
         ("Database", test_database),
-        ("File Processing", test_file_processing)
+        ("File Processing", test_file_processing),
+        ("Resume Details", test_resume_details),
+        ("List Page Queries", test_list_query_count),
+        ("Resume Page", test_view_resume),
+        ("Job Lists", test_job_lists),
+        ("Skill Matching", test_skill_matcher),
+        ("Vector Store", test_vector_store),
+        ("API Pagination", test_api_cursor),
+        ("Resume Export", test_export_rows),
+        ("Near Duplicates", test_near_duplicates),
+        ("Bulk Upload", test_bulk_upload)
     ]
     
     passed = 0